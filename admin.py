@@ -1,27 +1,51 @@
 from django.contrib import admin
+from django.db import transaction
+from .catalog import refresh_snapshot
+from .patient_search import search_patient_ids
 from .models import Patient, Symptom, Disease, Remedy, Report
 
+class CatalogAdminMixin:
+    """Swap in a fresh catalog snapshot as soon as an admin edit commits"""
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        transaction.on_commit(refresh_snapshot)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        transaction.on_commit(refresh_snapshot)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        transaction.on_commit(refresh_snapshot)
+
 @admin.register(Patient)
 class PatientAdmin(admin.ModelAdmin):
     list_display = ('name', 'age', 'gender', 'email', 'phone', 'created_at')
     search_fields = ('name', 'email', 'phone')
     list_filter = ('gender', 'created_at')
+    search_limit = 500
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Use the search index rather than an icontains scan of every column
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(pk__in=search_patient_ids(search_term, self.search_limit)), False
 
 @admin.register(Symptom)
-class SymptomAdmin(admin.ModelAdmin):
+class SymptomAdmin(CatalogAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'severity_level', 'body_part')
     search_fields = ('name', 'description')
     list_filter = ('severity_level', 'body_part')
 
 @admin.register(Disease)
-class DiseaseAdmin(admin.ModelAdmin):
+class DiseaseAdmin(CatalogAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'severity_level', 'common_age_group')
     search_fields = ('name', 'description')
     list_filter = ('severity_level',)
     filter_horizontal = ('symptoms',)
 
 @admin.register(Remedy)
-class RemedyAdmin(admin.ModelAdmin):
+class RemedyAdmin(CatalogAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'remedy_type', 'effectiveness_rating')
     search_fields = ('name', 'description')
     list_filter = ('remedy_type', 'effectiveness_rating')
@@ -0,0 +1,337 @@
+"""Process-local catalog snapshot used by the forms, search API and prediction views.
+
+The whole symptom, disease and remedy catalog is loaded into one immutable
+:class:`CatalogSnapshot`. Readers take a reference with :func:`get_snapshot`
+and keep using it for the rest of the request, so a concurrent catalog edit
+never gives them a half-updated view; the edit builds a new snapshot and
+swaps the module-level reference in a single assignment.
+
+Every catalog change also bumps the :class:`CatalogVersion` row in the
+same transaction. Each process compares its snapshot against that row at
+most every ``CATALOG_SNAPSHOT['CHECK_INTERVAL']`` seconds, so edits made
+by another worker or a management command reach it within that interval.
+"""
+import itertools
+import threading
+import time
+from types import MappingProxyType
+from typing import NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import CatalogVersion, Disease, Remedy, Symptom
+from .prediction import RemedyIndex, SymptomIndex
+from .result_cache import get_prediction_cache, make_key
+
+_REMEDY_TYPE_LABELS = dict(Remedy.TYPE_CHOICES)
+
+SNAPSHOT_DEFAULTS = {
+    'CHECK_INTERVAL': 1.0,
+}
+
+
+class SymptomRecord(NamedTuple):
+    id: int
+    name: str
+    description: str
+    severity_level: int
+    body_part: Optional[str]
+
+    def __str__(self):
+        return self.name
+
+
+class DiseaseRecord(NamedTuple):
+    id: int
+    name: str
+    description: str
+    severity_level: int
+    common_age_group: Optional[str]
+    symptoms: Tuple[SymptomRecord, ...]
+
+    def __str__(self):
+        return self.name
+
+
+class RemedyRecord(NamedTuple):
+    id: int
+    name: str
+    remedy_type: str
+    description: str
+    instructions: str
+    contraindications: Optional[str]
+    effectiveness_rating: int
+    disease_ids: Tuple[int, ...]
+    symptom_ids: Tuple[int, ...]
+
+    def get_remedy_type_display(self):
+        return _REMEDY_TYPE_LABELS.get(self.remedy_type, self.remedy_type)
+
+    def __str__(self):
+        return f"{self.name} ({self.get_remedy_type_display()})"
+
+
+def get_top_k():
+    """Number of diseases a prediction returns, from ``PREDICTION_TOP_K``"""
+    return getattr(settings, 'PREDICTION_TOP_K', 5)
+
+
+def _links(through, owner, target):
+    links = {}
+    for owner_id, target_id in through.objects.order_by(target).values_list(owner, target).iterator():
+        links.setdefault(owner_id, []).append(target_id)
+    return links
+
+
+class CatalogSnapshot:
+    """Immutable view of the catalog at one point in time.
+
+    Records are keyed by id in read-only mappings, in id order. ``version``
+    increases every time a snapshot is built in this process.
+    """
+    _versions = itertools.count(1)
+
+    def __init__(self, symptoms, diseases, remedies, generation=None):
+        """Build a snapshot from ``SymptomRecord``, ``DiseaseRecord`` and ``RemedyRecord`` iterables"""
+        self.version = next(self._versions)
+        self.generation = generation
+        self.symptoms = MappingProxyType({symptom.id: symptom for symptom in symptoms})
+        self.diseases = MappingProxyType({disease.id: disease for disease in diseases})
+        self.remedies = MappingProxyType({remedy.id: remedy for remedy in remedies})
+        self.body_parts = tuple(sorted({
+            symptom.body_part for symptom in self.symptoms.values() if symptom.body_part is not None
+        }))
+
+        self.symptom_index = SymptomIndex(
+            (
+                (disease.id, [symptom.id for symptom in disease.symptoms], disease.severity_level)
+                for disease in self.diseases.values()
+            ),
+            symptom_levels={symptom.id: symptom.severity_level for symptom in self.symptoms.values()},
+        )
+        self.remedy_index = RemedyIndex(
+            (remedy.id, remedy.effectiveness_rating, remedy.disease_ids, remedy.symptom_ids)
+            for remedy in self.remedies.values()
+        )
+
+    @classmethod
+    def load(cls, generation=None):
+        """Read the catalog from the database: one query per table"""
+        symptoms = {
+            row[0]: SymptomRecord(*row)
+            for row in Symptom.objects.order_by('id').values_list(
+                'id', 'name', 'description', 'severity_level', 'body_part').iterator()
+        }
+
+        disease_symptoms = _links(Disease.symptoms.through, 'disease_id', 'symptom_id')
+        diseases = [
+            DiseaseRecord(*row, symptoms=tuple(
+                symptoms[symptom_id] for symptom_id in disease_symptoms.get(row[0], ()) if symptom_id in symptoms
+            ))
+            for row in Disease.objects.order_by('id').values_list(
+                'id', 'name', 'description', 'severity_level', 'common_age_group').iterator()
+        ]
+
+        remedy_diseases = _links(Remedy.diseases.through, 'remedy_id', 'disease_id')
+        remedy_symptoms = _links(Remedy.symptoms.through, 'remedy_id', 'symptom_id')
+        remedies = [
+            RemedyRecord(
+                *row,
+                disease_ids=tuple(remedy_diseases.get(row[0], ())),
+                symptom_ids=tuple(remedy_symptoms.get(row[0], ())),
+            )
+            for row in Remedy.objects.order_by('id').values_list(
+                'id', 'name', 'remedy_type', 'description', 'instructions',
+                'contraindications', 'effectiveness_rating').iterator()
+        ]
+
+        return cls(symptoms.values(), diseases, remedies, generation=generation)
+
+    def symptoms_for(self, symptom_ids):
+        """Return the records for ``symptom_ids`` in id order, skipping unknown ids"""
+        wanted = {int(symptom_id) for symptom_id in symptom_ids}
+        return [symptom for symptom_id, symptom in self.symptoms.items() if symptom_id in wanted]
+
+    def search_symptoms(self, keyword='', body_part='', limit=20):
+        """Return up to ``limit`` symptoms whose name or description contains ``keyword``"""
+        keyword = keyword.casefold()
+        matches = []
+        for symptom in self.symptoms.values():
+            if body_part and symptom.body_part != body_part:
+                continue
+            if keyword and keyword not in symptom.name.casefold() and keyword not in symptom.description.casefold():
+                continue
+            matches.append(symptom)
+            if len(matches) >= limit:
+                break
+        return matches
+
+    def rank_diseases(self, symptom_ids, limit=None, mode='count', symptom_data=None):
+        """Return the top ``limit`` ``(disease_id, score)`` pairs for ``symptom_ids``.
+
+        ``mode`` is one of ``prediction.SCORING_MODES``; ``'weighted'`` uses the
+        severity and duration in ``symptom_data``.
+        """
+        if limit is None:
+            limit = get_top_k()
+        if mode == 'weighted':
+            symptom_data = symptom_data or {}
+            query = {
+                symptom_id: symptom_data.get(str(symptom_id), symptom_data.get(symptom_id, {}))
+                for symptom_id in symptom_ids
+            }
+        else:
+            query = symptom_ids
+        return self.symptom_index.rank(query, limit=limit, mode=mode)
+
+    def rank_diseases_batch(self, symptom_id_sets, limit=None, mode='count'):
+        """Rank diseases for many symptom-id sets at once.
+
+        In ``'weighted'`` mode each set is a ``{symptom_id: {'severity',
+        'duration'}}`` mapping. Returns one list of ``(disease_id, score)``
+        pairs per input set; see :meth:`SymptomIndex.rank_batch`. Falls back to
+        ranking one set at a time when NumPy or SciPy is unavailable.
+        """
+        if limit is None:
+            limit = get_top_k()
+        symptom_id_sets = list(symptom_id_sets)
+        try:
+            return self.symptom_index.rank_batch(symptom_id_sets, limit=limit, mode=mode)
+        except ImportError:
+            return [self.symptom_index.rank(query, limit=limit, mode=mode) for query in symptom_id_sets]
+
+    def recommend_remedy_ids(self, disease_ids, symptom_ids):
+        """Return ids of remedies for any of the diseases or symptoms, most effective first"""
+        return self.remedy_index.recommend(disease_ids, symptom_ids)
+
+    def load_diseases(self, ranking):
+        """Return the disease records for a ranking, in ranking order"""
+        return [self.diseases[disease_id] for disease_id, _ in ranking if disease_id in self.diseases]
+
+    def load_remedies(self, remedy_ids):
+        """Return the remedy records for ``remedy_ids``, in the same order"""
+        return [self.remedies[remedy_id] for remedy_id in remedy_ids if remedy_id in self.remedies]
+
+    def predict(self, symptom_ids, limit=None, mode='count', symptom_data=None):
+        """Return ``(ranking, remedy_ids)`` for a request, using the prediction cache.
+
+        ``ranking`` is a list of ``(disease_id, score)`` pairs as returned by
+        :meth:`rank_diseases`.
+        """
+        if limit is None:
+            limit = get_top_k()
+
+        def compute():
+            ranking = self.rank_diseases(symptom_ids, limit, mode, symptom_data)
+            remedy_ids = self.recommend_remedy_ids([disease_id for disease_id, _ in ranking], symptom_ids)
+            return ranking, remedy_ids
+
+        key = (self.catalog_key(), make_key(symptom_ids, mode, limit, symptom_data))
+        return get_prediction_cache().get_or_compute(key, compute)
+
+    def catalog_key(self):
+        """Identify the catalog this snapshot was built from, for prediction cache keys.
+
+        A request still holding an older snapshot then never stores its
+        results where readers of a newer one look. Snapshots from
+        :func:`get_snapshot` use the database catalog version, so processes
+        share entries; others use the process-local ``version``.
+        """
+        if self.generation is not None:
+            return ('shared', self.generation[1])
+        return ('local', self.version)
+
+
+_lock = threading.Lock()
+_snapshot = None
+_generations = itertools.count(1)
+_generation = next(_generations)
+# When the database catalog version was last read, and its value
+_checked = (None, 0)
+
+
+def catalog_version():
+    """Return the catalog version every process sees, from the CatalogVersion row"""
+    return CatalogVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+def bump_catalog_version():
+    """Record a catalog change; call it inside the transaction that makes the change"""
+    if CatalogVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            CatalogVersion.objects.create(pk=1, version=1)
+    except IntegrityError:
+        # Another writer created the row first
+        CatalogVersion.objects.filter(pk=1).update(version=F('version') + 1)
+
+
+def _current_generation():
+    # Changes made in this process bump _generation straight away; changes
+    # made elsewhere show up in the database version, read at most every
+    # CHECK_INTERVAL seconds.
+    global _checked
+    interval = dict(SNAPSHOT_DEFAULTS, **getattr(settings, 'CATALOG_SNAPSHOT', {}))['CHECK_INTERVAL']
+    checked_at, version = _checked
+    now = time.monotonic()
+    if checked_at is None or now - checked_at >= interval:
+        version = catalog_version()
+        _checked = (now, version)
+    return (_generation, version)
+
+
+def get_snapshot():
+    """Return the current CatalogSnapshot, rebuilding it if the catalog changed.
+
+    Callers should take one snapshot per request and use it throughout.
+    """
+    generation = _current_generation()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.generation == generation:
+        return snapshot
+    return _rebuild(generation)
+
+
+def _rebuild(generation):
+    global _snapshot
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is None or snapshot.generation != generation:
+            snapshot = CatalogSnapshot.load(generation=generation)
+            _snapshot = snapshot
+    return snapshot
+
+
+def invalidate_snapshot():
+    """Retire the current snapshot so the next reader builds a fresh one"""
+    global _generation, _checked
+    # Not taken under ``_lock``: a writer must never wait on a rebuild that
+    # is reading the tables it holds locked.
+    _generation = next(_generations)
+    _checked = (None, 0)
+
+
+def refresh_snapshot():
+    """Build a fresh snapshot now and swap it in"""
+    invalidate_snapshot()
+    return get_snapshot()
+
+
+def rank_diseases(symptom_ids, limit=None, mode='count', symptom_data=None):
+    """Rank diseases against the current snapshot; see :meth:`CatalogSnapshot.rank_diseases`"""
+    return get_snapshot().rank_diseases(symptom_ids, limit, mode, symptom_data)
+
+
+def predict_diseases(symptom_ids, limit=None, mode='count', symptom_data=None):
+    """Return the top ``limit`` ``(DiseaseRecord, score)`` pairs for ``symptom_ids``"""
+    snapshot = get_snapshot()
+    ranking = snapshot.rank_diseases(symptom_ids, limit, mode, symptom_data)
+    return [(snapshot.diseases[disease_id], score) for disease_id, score in ranking]
+
+
+def predict(symptom_ids, limit=None, mode='count', symptom_data=None):
+    """Predict against the current snapshot; see :meth:`CatalogSnapshot.predict`"""
+    return get_snapshot().predict(symptom_ids, limit, mode, symptom_data)
@@ -0,0 +1,248 @@
+"""Aggregates shown on the dashboard"""
+import datetime
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections, router
+from django.db.models import DateField, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .catalog import get_snapshot
+from .models import DailyDiseaseStat, DailyPatientStat, DailyReportStat, Patient, Report
+
+RANGE_CHOICES = (7, 30, 90, 365)
+GRANULARITY_CHOICES = ('day', 'week', 'month')
+
+_TRUNCATE = {
+    'day': lambda field: TruncDay(field, output_field=DateField()),
+    'week': lambda field: TruncWeek(field, output_field=DateField()),
+    'month': lambda field: TruncMonth(field, output_field=DateField()),
+}
+
+_LABEL_FORMATS = {
+    'day': '%b %d',
+    'week': 'Week of %b %d',
+    'month': '%b %Y',
+}
+
+
+def bucket_start(date, granularity):
+    """Return the first day of the bucket that ``date`` falls in"""
+    if granularity == 'week':
+        return date - datetime.timedelta(days=date.weekday())
+    if granularity == 'month':
+        return date.replace(day=1)
+    return date
+
+
+def next_bucket(date, granularity):
+    if granularity == 'week':
+        return date + datetime.timedelta(days=7)
+    if granularity == 'month':
+        return (date + datetime.timedelta(days=32)).replace(day=1)
+    return date + datetime.timedelta(days=1)
+
+
+def buckets(start, end, granularity):
+    """Return the first day of every bucket from ``start`` to ``end`` inclusive"""
+    current = bucket_start(start, granularity)
+    dates = []
+    while current <= end:
+        dates.append(current)
+        current = next_bucket(current, granularity)
+    return dates
+
+
+def date_range(days, today=None):
+    """Return the ``(first, last)`` dates of the last ``days`` days, including today"""
+    today = today or timezone.localdate()
+    return today - datetime.timedelta(days=days - 1), today
+
+
+def report_series(days=7, granularity='day', today=None):
+    """Return ``(labels, counts)`` of reports created per bucket over the last ``days`` days.
+
+    One grouped query over the daily rollup; buckets without reports are
+    filled with zero here rather than in SQL.
+    """
+    start, end = date_range(days, today)
+    counts = dict(
+        DailyReportStat.objects.filter(date__gte=start, date__lte=end)
+        .annotate(bucket=_TRUNCATE[granularity]('date'))
+        .values('bucket')
+        .annotate(total=Sum('count'))
+        .order_by()
+        .values_list('bucket', 'total')
+    )
+    dates = buckets(start, end, granularity)
+    label_format = _LABEL_FORMATS[granularity]
+    return [date.strftime(label_format) for date in dates], [counts.get(date, 0) for date in dates]
+
+
+def report_total():
+    """Number of reports, summed from the daily rollup"""
+    return DailyReportStat.objects.aggregate(total=Sum('count'))['total'] or 0
+
+
+def patient_total():
+    """Number of patients, summed from the daily rollup"""
+    return DailyPatientStat.objects.aggregate(total=Sum('count'))['total'] or 0
+
+
+def top_diseases(limit=5):
+    """Return the ``limit`` most often predicted diseases as dicts with a ``count``"""
+    catalog = get_snapshot()
+    totals = (
+        DailyDiseaseStat.objects.values('disease_id')
+        .annotate(total=Sum('count'))
+        .filter(total__gt=0)
+        .order_by('-total', 'disease_id')
+        .values_list('disease_id', 'total')
+    )
+    diseases = []
+    for disease_id, total in totals[:limit]:
+        disease = catalog.diseases.get(disease_id)
+        if disease is not None:
+            diseases.append(dict(disease._asdict(), count=total))
+    return diseases
+
+
+METRICS_DEFAULTS = {
+    'BACKEND': 'default',
+    'TIMEOUT': 3600,
+    'LIST_TIMEOUT': 60,
+    'APPROXIMATE': False,
+    # None: decide from the backend; True for a process-local cache only if
+    # the site runs in a single process
+    'SHARED': None,
+}
+
+
+def approximate_count(model):
+    """Row count from the planner statistics, or None when the database has none.
+
+    Only PostgreSQL keeps such an estimate (``pg_class.reltuples``); it is
+    refreshed by VACUUM and ANALYZE.
+    """
+    connection = connections[router.db_for_read(model)]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        row = cursor.fetchone()
+    # -1 means the table has never been analyzed
+    return row[0] if row and row[0] >= 0 else None
+
+
+class DashboardMetrics:
+    """Cached dashboard counters and lists.
+
+    Counters are computed once, then kept exact by :meth:`adjust` from the
+    ``post_save``/``post_delete`` handlers, and recomputed after ``timeout``
+    seconds to correct any drift. With ``approximate`` set, the patient
+    count is taken from planner statistics where available. Both lists are
+    cached for ``list_timeout`` seconds, and the recent reports are also
+    dropped whenever a report or patient changes.
+
+    A process-local cache (local memory or dummy) cannot see the
+    adjustments other processes make, so unless ``shared`` says otherwise
+    the counters are then read on every call instead of cached. Both
+    totals come from the daily rollups, so that stays cheap as the
+    tables grow.
+    """
+    prefix = 'health_predictor:dashboard:'
+
+    def __init__(self, cache, timeout=3600, list_timeout=60, approximate=False, shared=None):
+        self.cache = cache
+        self.shared = not isinstance(cache, (LocMemCache, DummyCache)) if shared is None else shared
+        self.timeout = timeout
+        self.list_timeout = list_timeout
+        self.approximate = approximate
+
+    @classmethod
+    def from_settings(cls):
+        options = dict(METRICS_DEFAULTS, **getattr(settings, 'DASHBOARD_METRICS', {}))
+        return cls(
+            caches[options['BACKEND']],
+            timeout=options['TIMEOUT'],
+            list_timeout=options['LIST_TIMEOUT'],
+            approximate=options['APPROXIMATE'],
+            shared=options['SHARED'],
+        )
+
+    def counts(self):
+        """Return ``{'patient_count', 'report_count', 'symptom_count'}``"""
+        if not self.shared:
+            return {
+                'patient_count': self._patient_count(),
+                'report_count': report_total(),
+                'symptom_count': len(get_snapshot().symptoms),
+            }
+        return {
+            'patient_count': self._cached('patient_count', self.timeout, self._patient_count),
+            'report_count': self._cached('report_count', self.timeout, report_total),
+            'symptom_count': len(get_snapshot().symptoms),
+        }
+
+    def recent_reports(self, limit=5):
+        return self._cached(f'recent_reports:{limit}', self.list_timeout, lambda: list(
+            Report.objects.select_related('patient').prefetch_related('predicted_diseases')
+            .order_by('-created_at')[:limit]
+        ))
+
+    def common_diseases(self, limit=5):
+        return self._cached(f'common_diseases:{limit}', self.list_timeout, lambda: top_diseases(limit))
+
+    def adjust(self, name, delta):
+        """Add ``delta`` to a cached counter; a counter not yet cached is left to be computed"""
+        try:
+            self.cache.incr(self.prefix + name, delta)
+        except ValueError:
+            pass
+
+    def reports_changed(self, delta=0):
+        """Account for ``delta`` reports added (or removed) and refresh the recent list"""
+        if delta:
+            self.adjust('report_count', delta)
+        self.cache.delete(self.prefix + 'recent_reports:5')
+
+    def patients_changed(self, delta=0):
+        """Account for ``delta`` patients added (or removed); names show in the recent list"""
+        if delta:
+            self.adjust('patient_count', delta)
+        self.cache.delete(self.prefix + 'recent_reports:5')
+
+    def clear(self):
+        self.cache.delete_many([
+            self.prefix + name
+            for name in ('patient_count', 'report_count', 'recent_reports:5', 'common_diseases:5')
+        ])
+
+    def _patient_count(self):
+        count = approximate_count(Patient) if self.approximate else None
+        return patient_total() if count is None else count
+
+    def _cached(self, name, timeout, compute):
+        value = self.cache.get(self.prefix + name)
+        if value is None:
+            value = compute()
+            self.cache.add(self.prefix + name, value, timeout)
+        return value
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_dashboard_metrics():
+    """Return the process-wide DashboardMetrics, configured from settings"""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = DashboardMetrics.from_settings()
+    return _metrics
@@ -1,5 +1,6 @@
 from django import forms
-from .models import Patient, Symptom, Report
+from .catalog import get_snapshot
+from .models import Patient, Report
 
 class PatientForm(forms.ModelForm):
     """Form for patient registration"""
@@ -16,14 +17,14 @@ class SymptomChecklistForm(forms.Form):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Group symptoms by body part for better organization
-        body_parts = Symptom.objects.values_list('body_part', flat=True).distinct()
+        symptoms = get_snapshot().symptoms.values()
+        body_parts = {}
+        for symptom in symptoms:
+            if symptom.body_part:  # Skip empty body parts
+                body_parts.setdefault(symptom.body_part, []).append(symptom)
         
-        for body_part in body_parts:
-            if not body_part:  # Skip empty body parts
-                continue
-                
-            symptoms = Symptom.objects.filter(body_part=body_part)
-            for symptom in symptoms:
+        for body_part_symptoms in body_parts.values():
+            for symptom in body_part_symptoms:
                 self.fields[f'symptom_{symptom.id}'] = forms.BooleanField(
                     label=symptom.name,
                     required=False,
@@ -31,7 +32,7 @@ class SymptomChecklistForm(forms.Form):
                 )
                 
         # Add general symptoms (those without a specific body part)
-        general_symptoms = Symptom.objects.filter(body_part__isnull=True)
+        general_symptoms = [symptom for symptom in symptoms if symptom.body_part is None]
         for symptom in general_symptoms:
             self.fields[f'symptom_{symptom.id}'] = forms.BooleanField(
                 label=symptom.name,
@@ -89,6 +90,19 @@ class SymptomSearchForm(forms.Form):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Dynamically populate body part choices
-        body_parts = Symptom.objects.exclude(body_part__isnull=True).values_list(
-            'body_part', flat=True).distinct().order_by('body_part')
-        self.fields['body_part'].choices += [(bp, bp) for bp in body_parts]
\ No newline at end of file
+        body_parts = get_snapshot().body_parts
+        self.fields['body_part'].choices += [(bp, bp) for bp in body_parts]
+
+class ReportExportFilterForm(forms.Form):
+    """Filters for the bulk report export"""
+    patient = forms.IntegerField(required=False, min_value=1)
+    status = forms.ChoiceField(required=False, choices=[('', 'Any Status')] + list(Report.STATUS_CHOICES))
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end and start > end:
+            raise forms.ValidationError('The start date must not be after the end date.')
+        return cleaned_data
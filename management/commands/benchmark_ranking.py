@@ -0,0 +1,62 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from health_predictor.prediction import SymptomIndex
+
+
+class Command(BaseCommand):
+    help = 'Benchmark disease ranking against synthetic catalogs of increasing size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000],
+                            help='Catalog sizes (number of diseases) to benchmark')
+        parser.add_argument('--symptoms', type=int, default=500, help='Number of distinct symptoms')
+        parser.add_argument('--requests', type=int, default=500, help='Requests scored per catalog size')
+        parser.add_argument('--top-k', type=int, default=5, help='Number of diseases returned per request')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        symptom_count = options['symptoms']
+        top_k = options['top_k']
+
+        queries = [
+            rng.sample(range(symptom_count), rng.randint(1, 6))
+            for _ in range(options['requests'])
+        ]
+
+        self.stdout.write(f"{'diseases':>10} {'full sort':>12} {'top-k':>12} {'batch':>12}   (ms per request)")
+        for size in options['sizes']:
+            index = SymptomIndex(
+                (disease_id, rng.sample(range(symptom_count), rng.randint(3, 10)), rng.randint(1, 10))
+                for disease_id in range(size)
+            )
+
+            full_sort = self.time_per_request(queries, lambda query: self.full_sort(index, query, top_k))
+            bounded = self.time_per_request(queries, lambda query: index.rank_by_count(query, limit=top_k))
+            try:
+                index.incidence_matrix()
+                started = time.perf_counter()
+                index.rank_batch(queries, limit=top_k)
+                batch = f"{(time.perf_counter() - started) * 1000 / len(queries):12.3f}"
+            except ImportError:
+                batch = f"{'n/a':>12}"
+
+            self.stdout.write(f"{size:>10} {full_sort:12.3f} {bounded:12.3f} {batch}")
+
+    def time_per_request(self, queries, rank):
+        started = time.perf_counter()
+        for query in queries:
+            rank(query)
+        return (time.perf_counter() - started) * 1000 / len(queries)
+
+    def full_sort(self, index, query, top_k):
+        """The previous approach: sort every candidate, then slice"""
+        severity_levels = index.severity_levels
+        ranked = sorted(
+            index.matches(query),
+            key=lambda item: (-item[1], -severity_levels[item[0]], item[0]),
+        )
+        return ranked[:top_k]
@@ -0,0 +1,70 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from health_predictor.models import Patient, Report
+
+
+class Command(BaseCommand):
+    help = 'Delete duplicate draft reports left behind by refreshing the prediction results page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of patients whose reports are compared per transaction')
+        parser.add_argument('--window', type=int, default=60,
+                            help='Minutes after a draft within which an identical draft counts as a duplicate')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted without deleting')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        dry_run = options['dry_run']
+        window = datetime.timedelta(minutes=options['window'])
+        patient_ids = Patient.objects.filter(reports__status='DRAFT').order_by('id').values_list('id', flat=True).distinct()
+
+        last_id = 0
+        checked = deleted = 0
+        while True:
+            chunk = list(patient_ids.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1]
+
+            with transaction.atomic():
+                duplicates, count = self.find_duplicates(chunk, window)
+                if duplicates and not dry_run:
+                    Report.objects.filter(id__in=duplicates).delete()
+            checked += count
+            deleted += len(duplicates)
+            self.stdout.write(f'Checked {checked} draft reports, {len(duplicates)} duplicates in this chunk')
+
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {deleted} duplicate draft reports'))
+
+    def find_duplicates(self, patient_ids, window):
+        """Return ids of drafts identical to an older draft created at most ``window`` before them.
+
+        Only refreshes of one assessment are duplicates; the same answers
+        given again later are a separate assessment and keep their report.
+        """
+        reports = Report.objects.filter(patient_id__in=patient_ids, status='DRAFT')
+        report_ids = list(reports.values_list('id', flat=True))
+        links = {report_id: ([], [], []) for report_id in report_ids}
+        for position, (through, column) in enumerate((
+            (Report.symptoms.through, 'symptom_id'),
+            (Report.predicted_diseases.through, 'disease_id'),
+            (Report.recommended_remedies.through, 'remedy_id'),
+        )):
+            for report_id, target_id in through.objects.filter(report_id__in=report_ids).values_list('report_id', column):
+                links[report_id][position].append(target_id)
+
+        kept = {}
+        duplicates = []
+        for report_id, patient_id, title, notes, created_at in reports.order_by('created_at', 'id').values_list(
+                'id', 'patient_id', 'title', 'notes', 'created_at'):
+            key = (patient_id, title, notes) + tuple(frozenset(ids) for ids in links[report_id])
+            if key in kept and created_at - kept[key] <= window:
+                duplicates.append(report_id)
+            else:
+                kept[key] = created_at
+        return duplicates, len(report_ids)
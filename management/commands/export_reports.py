@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from health_predictor.forms import ReportExportFilterForm
+from health_predictor.report_export import bulk_rows, filter_reports, stream_csv
+
+
+class Command(BaseCommand):
+    help = 'Export every report matching the filters as CSV, streaming so memory stays flat'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patient', type=int, help='Only reports of this patient id')
+        parser.add_argument('--status', help='Only reports with this status')
+        parser.add_argument('--start', help='Only reports created on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Only reports created on or before this date (YYYY-MM-DD)')
+        parser.add_argument('--output', default='-', help="File to write, or '-' for standard output")
+        parser.add_argument('--chunk-size', type=int, default=500, help='Reports loaded, with their links, per batch')
+
+    def handle(self, *args, **options):
+        form = ReportExportFilterForm({name: options[name] for name in ('patient', 'status', 'start', 'end')})
+        if not form.is_valid():
+            raise CommandError('; '.join(
+                f'{field}: {" ".join(messages)}' for field, messages in form.errors.items()
+            ))
+
+        rows = bulk_rows(filter_reports(**form.cleaned_data), chunk_size=options['chunk_size'])
+        to_stdout = options['output'] == '-'
+        output = None if to_stdout else open(options['output'], 'w', newline='', encoding='utf-8')
+        exported = -1  # Not counting the header
+        try:
+            for line in stream_csv(rows):
+                if to_stdout:
+                    self.stdout.write(line, ending='')
+                else:
+                    output.write(line)
+                exported += 1
+        finally:
+            if output:
+                output.close()
+
+        if not to_stdout:
+            self.stdout.write(self.style.SUCCESS(f'Exported {exported} reports to {options["output"]}'))
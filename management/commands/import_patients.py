@@ -0,0 +1,61 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from health_predictor.patient_import import FORMATS, import_patients, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import patients from a CSV or newline-delimited JSON file, validated like the patient form'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for standard input")
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Input format; defaults to the file extension, or csv for standard input')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Patients written per transaction')
+        parser.add_argument('--rejects', help='Write rejected rows and their errors to this file as NDJSON')
+        parser.add_argument('--dry-run', action='store_true', help='Validate the input without writing anything')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        try:
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(exc)
+        rejects = open(options['rejects'], 'w', encoding='utf-8') if options['rejects'] else None
+        started = time.monotonic()
+
+        def progress(imported, rejected):
+            rate = imported / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(f'{imported} patients imported, {rejected} rejected ({rate:.0f} rows/s)')
+
+        def reject(row):
+            if rejects:
+                rejects.write(json.dumps(row._asdict(), default=str) + '\n')
+            else:
+                self.stderr.write(f'Line {row.line}: {json.dumps(row.errors)}')
+
+        try:
+            imported, rejected = import_patients(
+                read_rows(stream, format),
+                chunk_size=options['chunk_size'],
+                dry_run=options['dry_run'],
+                progress=progress,
+                reject=reject,
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if rejects:
+                rejects.close()
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {imported} patients in {time.monotonic() - started:.1f}s; {rejected} rows rejected'
+        ))
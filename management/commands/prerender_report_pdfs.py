@@ -0,0 +1,41 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from health_predictor.models import Report
+from health_predictor.report_pdf import get_report_pdf_cache, pdf_queryset
+
+
+class Command(BaseCommand):
+    help = 'Render PDFs of recently shared reports ahead of time so downloads are served from the cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Reports updated within this many days')
+        parser.add_argument('--status', default='SHARED', help="Report status to render, or 'all'")
+        parser.add_argument('--chunk-size', type=int, default=200, help='Reports loaded, with their links, per batch')
+
+    def handle(self, *args, **options):
+        cache = get_report_pdf_cache()
+        reports = Report.objects.filter(updated_at__gte=timezone.now() - datetime.timedelta(days=options['days']))
+        if options['status'] != 'all':
+            reports = reports.filter(status=options['status'])
+
+        # Only the revision columns are needed to tell which files are missing
+        missing = []
+        cached = 0
+        for report in reports.only('uuid', 'updated_at').iterator(chunk_size=2000):
+            if cache.get(report):
+                cached += 1
+            else:
+                missing.append(report.pk)
+
+        chunk_size = options['chunk_size']
+        for start in range(0, len(missing), chunk_size):
+            for report in pdf_queryset(Report.objects.filter(pk__in=missing[start:start + chunk_size])):
+                cache.render(report)
+            self.stdout.write(f'Rendered {min(start + chunk_size, len(missing))} of {len(missing)} reports')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {len(missing)} PDFs into {cache.directory}; {cached} were already cached'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from health_predictor.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Backfill or rebuild the daily report and disease rollups read by the dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Reports aggregated per query')
+
+    def handle(self, *args, **options):
+        scanned = rebuild(
+            chunk_size=options['chunk_size'],
+            progress=lambda count: self.stdout.write(f'Aggregated {count} reports'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rollups from {scanned} reports'))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_predictor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='report',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
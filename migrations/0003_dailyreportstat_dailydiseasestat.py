@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_predictor', '0002_alter_report_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyReportStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('DRAFT', 'Draft'), ('COMPLETED', 'Completed'), ('SHARED', 'Shared')], max_length=10)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('date', 'status')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyDiseaseStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('disease', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='health_predictor.disease')),
+            ],
+            options={
+                'unique_together': {('date', 'disease')},
+            },
+        ),
+    ]
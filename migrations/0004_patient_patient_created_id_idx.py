@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_predictor', '0003_dailyreportstat_dailydiseasestat'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['-created_at', '-id'], name='patient_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+from django.db import migrations
+
+
+FTS_TABLE = 'health_predictor_patient_search'
+PATIENT_TABLE = 'health_predictor_patient'
+
+POSTGRESQL_FORWARDS = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    "CREATE INDEX patient_search_document_idx ON health_predictor_patient USING gin ("
+    "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(email, '') || ' ' || coalesce(phone, '')))",
+    'CREATE INDEX patient_name_trgm_idx ON health_predictor_patient USING gin (name gin_trgm_ops)',
+    'CREATE INDEX patient_email_trgm_idx ON health_predictor_patient USING gin (email gin_trgm_ops)',
+    'CREATE INDEX patient_phone_trgm_idx ON health_predictor_patient USING gin (phone gin_trgm_ops)',
+]
+
+POSTGRESQL_BACKWARDS = [
+    'DROP INDEX IF EXISTS patient_search_document_idx',
+    'DROP INDEX IF EXISTS patient_name_trgm_idx',
+    'DROP INDEX IF EXISTS patient_email_trgm_idx',
+    'DROP INDEX IF EXISTS patient_phone_trgm_idx',
+]
+
+# An external-content FTS5 table: it stores only the index, and the
+# triggers keep it in step with every write to the patient table.
+SQLITE_FORWARDS = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    f"name, email, phone, content='{PATIENT_TABLE}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON {PATIENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, email, phone) VALUES (new.id, new.name, new.email, new.phone); END",
+    f"CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON {PATIENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, email, phone) "
+    f"VALUES ('delete', old.id, old.name, old.email, old.phone); END",
+    f"CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF name, email, phone ON {PATIENT_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, email, phone) "
+    f"VALUES ('delete', old.id, old.name, old.email, old.phone); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, email, phone) VALUES (new.id, new.name, new.email, new.phone); END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARDS = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_predictor', '0004_patient_patient_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': POSTGRESQL_FORWARDS, 'sqlite': SQLITE_FORWARDS}),
+            run({'postgresql': POSTGRESQL_BACKWARDS, 'sqlite': SQLITE_BACKWARDS}),
+        ),
+    ]
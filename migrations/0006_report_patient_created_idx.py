@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_predictor', '0005_patient_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['patient', '-created_at', '-id'], name='report_patient_created_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    """Fill the rollups from existing reports, unless rebuild_rollups has already done so"""
+    alias = schema_editor.connection.alias
+    Report = apps.get_model('health_predictor', 'Report')
+    DailyReportStat = apps.get_model('health_predictor', 'DailyReportStat')
+    DailyDiseaseStat = apps.get_model('health_predictor', 'DailyDiseaseStat')
+    if DailyReportStat.objects.using(alias).exists() or DailyDiseaseStat.objects.using(alias).exists():
+        return
+
+    DailyReportStat.objects.using(alias).bulk_create([
+        DailyReportStat(date=date, status=status, count=count)
+        for date, status, count in (
+            Report.objects.using(alias).annotate(date=TruncDate('created_at'))
+            .values('date', 'status').annotate(count=Count('pk')).order_by()
+            .values_list('date', 'status', 'count')
+        )
+    ], batch_size=1000)
+    DailyDiseaseStat.objects.using(alias).bulk_create([
+        DailyDiseaseStat(date=date, disease_id=disease_id, count=count)
+        for date, disease_id, count in (
+            Report.predicted_diseases.through.objects.using(alias).annotate(date=TruncDate('report__created_at'))
+            .values('date', 'disease_id').annotate(count=Count('pk')).order_by()
+            .values_list('date', 'disease_id', 'count')
+        )
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_predictor', '0006_report_patient_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
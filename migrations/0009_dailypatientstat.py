@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:52
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_patients(apps, schema_editor):
+    """Fill the daily patient rollup from existing patients"""
+    alias = schema_editor.connection.alias
+    Patient = apps.get_model('health_predictor', 'Patient')
+    DailyPatientStat = apps.get_model('health_predictor', 'DailyPatientStat')
+    if DailyPatientStat.objects.using(alias).exists():
+        return
+
+    DailyPatientStat.objects.using(alias).bulk_create([
+        DailyPatientStat(date=date, count=count)
+        for date, count in (
+            Patient.objects.using(alias).annotate(date=TruncDate('created_at'))
+            .values('date').annotate(count=Count('pk')).order_by()
+            .values_list('date', 'count')
+        )
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health_predictor', '0008_catalogversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPatientStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_patients, migrations.RunPython.noop),
+    ]
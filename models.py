@@ -22,6 +22,12 @@ class Patient(models.Model):
     
     def __str__(self):
         return f"{self.name} ({self.age})"
+    
+    class Meta:
+        indexes = [
+            # Keyset pagination of the patient list
+            models.Index(fields=['-created_at', '-id'], name='patient_created_id_idx'),
+        ]
 
 class Symptom(models.Model):
     """Model for storing symptoms"""
@@ -84,7 +90,7 @@ class Report(models.Model):
     recommended_remedies = models.ManyToManyField(Remedy, related_name='reports', blank=True)
     notes = models.TextField(blank=True, null=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='DRAFT')
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
@@ -95,6 +101,51 @@ class Report(models.Model):
         return f"/reports/{self.uuid}/"
     
     def export_to_pdf(self):
-        """Method to export report to PDF format"""
-        # Implementation will be added later
-        pass
+        """Render the report as PDF and return the bytes"""
+        from .report_pdf import render_report_pdf
+        return render_report_pdf(self)
+    
+    class Meta:
+        indexes = [
+            # A patient's report history, newest first
+            models.Index(fields=['patient', '-created_at', '-id'], name='report_patient_created_idx'),
+        ]
+
+class DailyReportStat(models.Model):
+    """Number of reports created on a day, per status"""
+    date = models.DateField()
+    status = models.CharField(max_length=10, choices=Report.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.count}"
+    
+    class Meta:
+        unique_together = ('date', 'status')
+
+class DailyDiseaseStat(models.Model):
+    """Number of reports created on a day that predicted a disease"""
+    date = models.DateField()
+    disease = models.ForeignKey(Disease, on_delete=models.CASCADE, related_name='daily_stats')
+    count = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.date} {self.disease}: {self.count}"
+    
+    class Meta:
+        unique_together = ('date', 'disease')
+
+class DailyPatientStat(models.Model):
+    """Number of patients registered on a day"""
+    date = models.DateField(unique=True)
+    count = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.date}: {self.count}"
+
+class CatalogVersion(models.Model):
+    """A single row counting catalog changes, so every process can tell its catalog snapshot is stale"""
+    version = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"Catalog version {self.version}"
@@ -0,0 +1,106 @@
+"""Keyset (cursor) pagination for large, append-mostly tables.
+
+Pages are addressed by an opaque cursor holding the ordering values of the
+row at the page edge, so fetching a page is one indexed range scan of
+``per_page + 1`` rows no matter how deep it is, and no total COUNT is run.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+class InvalidCursor(Http404):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Paginate ``queryset`` on a unique ``ordering`` such as ``('-created_at', '-id')``"""
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = [name.startswith('-') for name in self.ordering]
+        model_fields = {field.attname: field for field in queryset.model._meta.concrete_fields}
+        self.model_fields = [model_fields[name] for name in self.fields]
+
+    def page(self, after=None, before=None):
+        """Return the page following cursor ``after``, or preceding cursor ``before``.
+
+        With neither, returns the first page.
+        """
+        if before:
+            values = self.decode_cursor(before)
+            rows = list(
+                self.queryset.filter(self._beyond(values, reverse=True))
+                .order_by(*self._flip(self.ordering))[:self.per_page + 1]
+            )
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            previous_cursor = self.cursor_for(rows[0]) if has_more and rows else None
+            next_cursor = self.cursor_for(rows[-1]) if rows else None
+            return KeysetPage(rows, next_cursor, previous_cursor)
+
+        queryset = self.queryset
+        if after:
+            queryset = queryset.filter(self._beyond(self.decode_cursor(after)))
+        rows = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        next_cursor = self.cursor_for(rows[-1]) if has_more else None
+        previous_cursor = self.cursor_for(rows[0]) if after and rows else None
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def cursor_for(self, obj):
+        values = [field.value_to_string(obj) for field in self.model_fields]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            if len(values) != len(self.fields):
+                raise ValueError(cursor)
+            return [field.to_python(value) for field, value in zip(self.model_fields, values)]
+        except (ValueError, TypeError, ValidationError) as exc:
+            raise InvalidCursor('Invalid page cursor') from exc
+
+    def _beyond(self, values, reverse=False):
+        """Q for rows strictly past ``values`` in the ordering (or before it, with ``reverse``)"""
+        condition = Q()
+        for position in range(len(self.fields) - 1, -1, -1):
+            lookup = 'lt' if self.descending[position] != reverse else 'gt'
+            step = Q(**{f'{self.fields[position]}__{lookup}': values[position]})
+            if position < len(self.fields) - 1:
+                step |= Q(**{self.fields[position]: values[position]}) & condition
+            condition = step
+        return condition
+
+    @staticmethod
+    def _flip(ordering):
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
@@ -0,0 +1,171 @@
+"""Bulk import of patients from CSV or newline-delimited JSON"""
+import csv
+import json
+import operator
+from typing import NamedTuple
+
+from django.core.exceptions import ValidationError
+from django.core.validators import EMPTY_VALUES
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from . import rollups
+from .dashboard import get_dashboard_metrics
+from .forms import PatientForm
+from .models import Patient
+from .patient_search import bulk_indexing
+
+FORMATS = ('csv', 'ndjson')
+
+_MISSING = object()
+
+
+class Reject(NamedTuple):
+    """A row that failed validation, with its 1-based position in the input"""
+    line: int
+    row: dict
+    errors: dict
+
+
+def read_rows(stream, format='csv'):
+    """Yield ``(line, row)`` pairs from ``stream`` one at a time"""
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == 'ndjson':
+        for line, text in enumerate(stream, 1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as exc:
+                row = {'_error': str(exc)}
+            yield line, row if isinstance(row, dict) else {'_error': 'Expected a JSON object'}
+    else:
+        raise ValueError(f'Unknown format {format!r}; expected one of {", ".join(FORMATS)}')
+
+
+class PatientValidator:
+    """Clean rows with the field rules of :class:`PatientForm`.
+
+    The form's fields are built once and reused for every row, which is
+    much cheaper than binding a new form per row. Each field also
+    remembers what its first ``memo_size`` distinct valid inputs cleaned
+    to, so repeated values such as ages and genders are cleaned once.
+    """
+
+    def __init__(self, memo_size=512):
+        self.fields = dict(PatientForm().fields)
+        # What an optional field cleans an empty value to, so empty cells skip clean()
+        self.empty_values = {
+            name: getattr(field, 'empty_value', None) for name, field in self.fields.items() if not field.required
+        }
+        self.memo_size = memo_size
+        self.memos = {name: {} for name in self.fields}
+        self._plan = [
+            (name, field, name in self.empty_values, self.empty_values.get(name), self.memos[name])
+            for name, field in self.fields.items()
+        ]
+
+    def clean(self, row):
+        """Return ``(values, errors)`` for a raw row"""
+        if '_error' in row:
+            return None, {'__all__': [row['_error']]}
+        values = {}
+        errors = {}
+        for name, field, optional, empty_value, memo in self._plan:
+            raw = row.get(name)
+            if isinstance(raw, str):
+                raw = raw.strip()
+            if optional and raw in EMPTY_VALUES:
+                values[name] = empty_value
+                continue
+            # Keyed on the type too, so JSON true is not taken for a cached 1
+            key = (type(raw), raw)
+            try:
+                cached = memo.get(key, _MISSING)
+            except TypeError:
+                key, cached = None, _MISSING  # a list or object from NDJSON; clean() rejects it
+            if cached is not _MISSING:
+                values[name] = cached
+                continue
+            try:
+                values[name] = field.clean(raw)
+            except ValidationError as exc:
+                errors[name] = exc.messages
+                continue
+            if key is not None and len(memo) < self.memo_size:
+                memo[key] = values[name]
+        return values, errors
+
+
+def insert_patients(rows):
+    """Insert cleaned patient values with one ``executemany``; use inside a transaction.
+
+    This skips building a model instance and preparing every value through
+    the ORM, which is where ``bulk_create`` spends most of its time. The
+    values from :class:`PatientValidator` are already the str, int or None
+    each column stores; ``created_at`` and ``updated_at`` are set to now.
+No post_save is sent, so the daily patient rollup is bumped here.
+    """
+    connection = connections[router.db_for_write(Patient)]
+    created_at = timezone.now()
+    now = connection.ops.adapt_datetimefield_value(created_at)
+    fields = [field for field in Patient._meta.concrete_fields if not field.primary_key]
+    defaults = {
+        field.name: now if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+        else field.get_db_prep_save(field.get_default(), connection)
+        for field in fields
+    }
+    # Every row has the same keys, so one itemgetter pulls the cleaned values
+    # and the remaining columns are the same for the whole chunk
+    present = [field for field in fields if field.name in rows[0]]
+    fields = present + [field for field in fields if field.name not in rows[0]]
+    values = operator.itemgetter(*[field.name for field in present])
+    tail = tuple(defaults[field.name] for field in fields[len(present):])
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(Patient._meta.db_table),
+        ', '.join(connection.ops.quote_name(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    with bulk_indexing(connection), connection.cursor() as cursor:
+        cursor.executemany(sql, [values(row) + tail for row in rows])
+    rollups.record_patients_created(created_at, len(rows))
+
+
+def import_patients(rows, chunk_size=5000, dry_run=False, progress=None, reject=None):
+    """Validate ``(line, row)`` pairs and write the valid ones, ``chunk_size`` per transaction.
+
+    ``progress(imported, rejected)`` is called after each chunk and
+    ``reject(Reject)`` for each invalid row. A chunk that commits stays
+    committed if a later one fails. Returns ``(imported, rejected)``.
+    """
+    validator = PatientValidator()
+    imported = rejected = 0
+    chunk = []
+
+    def flush():
+        nonlocal imported
+        if chunk and not dry_run:
+            with transaction.atomic():
+                insert_patients(chunk)
+                # No post_save is sent, so count the new patients here
+                transaction.on_commit(lambda count=len(chunk): get_dashboard_metrics().patients_changed(count))
+        imported += len(chunk)
+        chunk.clear()
+        if progress:
+            progress(imported, rejected)
+
+    for line, row in rows:
+        values, errors = validator.clean(row)
+        if errors:
+            rejected += 1
+            if reject:
+                reject(Reject(line, row, errors))
+            continue
+        chunk.append(values)
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+    return imported, rejected
@@ -0,0 +1,152 @@
+"""Ranked prefix search over patient name, email and phone.
+
+Backed by the index that migration 0005 builds for the database in use:
+
+* PostgreSQL: a GIN full-text index on name, email and phone, plus GIN
+  trigram indexes (``pg_trgm``) for substring and misspelt matches.
+* SQLite: the ``health_predictor_patient_search`` FTS5 table, kept in step
+  with the patient table by triggers.
+
+Other databases fall back to an unindexed ``icontains`` scan.
+"""
+import re
+from contextlib import contextmanager
+
+from django.db import DatabaseError, connections, router
+from django.db.models import Case, IntegerField, Q, When
+
+from .models import Patient
+
+FTS_TABLE = 'health_predictor_patient_search'
+
+# The same expression as the full-text index, so the planner can use it
+_PG_DOCUMENT = (
+    "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(email, '') || ' ' || coalesce(phone, ''))"
+)
+
+_fts_tables = {}
+
+
+def search_terms(query):
+    """Split a search box query into word tokens, as the indexes tokenize text"""
+    return re.findall(r'\w+', query.lower())
+
+
+def search_patient_ids(query, limit=20):
+    """Return up to ``limit`` ids of patients matching ``query``, best match first.
+
+    Every word must match the start of a word in the name, email or phone.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    connection = connections[router.db_for_read(Patient)]
+    if connection.vendor == 'postgresql':
+        return _postgresql_ids(connection, query.strip(), terms, limit)
+    if connection.vendor == 'sqlite' and _has_fts_table(connection):
+        return _sqlite_ids(connection, terms, limit)
+    return _scan_ids(terms, limit)
+
+
+def search_patients(query, limit=20, queryset=None):
+    """Return the matching patients as a list, best match first"""
+    ids = search_patient_ids(query, limit)
+    queryset = Patient.objects.all() if queryset is None else queryset
+    patients = queryset.in_bulk(ids)
+    return [patients[pk] for pk in ids if pk in patients]
+
+
+@contextmanager
+def bulk_indexing(connection):
+    """Index rows inserted in the block with one statement instead of a trigger call per row.
+
+    Use inside the transaction that inserts the patients. On SQLite the
+    insert trigger from migration 0005 is dropped for the block and
+    recreated from its stored definition afterwards; the schema change is
+    part of the transaction, so other connections never see it. Other
+    databases index on write already and are left alone.
+    """
+    if connection.vendor != 'sqlite' or not _has_fts_table(connection):
+        yield
+        return
+    table = connection.ops.quote_name(Patient._meta.db_table)
+    trigger = f'{FTS_TABLE}_insert'
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = %s", [trigger])
+        definition = cursor.fetchone()
+        if definition is None:
+            yield
+            return
+        # Dropping the trigger takes the write lock, so no other insert lands
+        # between reading the last id and indexing everything after it.
+        cursor.execute(f'DROP TRIGGER {trigger}')
+        cursor.execute(f'SELECT coalesce(max(id), 0) FROM {table}')
+        last_id = cursor.fetchone()[0]
+    yield
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE}(rowid, name, email, phone) '
+            f'SELECT id, name, email, phone FROM {table} WHERE id > %s',
+            [last_id],
+        )
+        cursor.execute(definition[0])
+
+
+def _postgresql_ids(connection, query, terms, limit):
+    table = connection.ops.quote_name(Patient._meta.db_table)
+    like = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT id FROM {table}, to_tsquery('simple', %s) AS query
+            WHERE {_PG_DOCUMENT} @@ query
+               OR name ILIKE %s OR email ILIKE %s OR phone ILIKE %s
+            ORDER BY ts_rank({_PG_DOCUMENT}, query)
+                     + greatest(word_similarity(%s, name), word_similarity(%s, coalesce(email, ''))) DESC,
+                     id DESC
+            LIMIT %s
+            """,
+            [' & '.join(f'{term}:*' for term in terms), like, like, like, query, query, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _sqlite_ids(connection, terms, limit):
+    # Quoted so FTS5 operators in the input are taken literally; * makes each a prefix
+    match = ' '.join('"%s"*' % term.replace('"', '""') for term in terms)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            # Name matches weigh more than email and phone matches
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, 10.0, 2.0, 2.0), rowid DESC LIMIT %s',
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _scan_ids(terms, limit):
+    condition = Q()
+    for term in terms:
+        condition &= Q(name__icontains=term) | Q(email__icontains=term) | Q(phone__icontains=term)
+    return list(
+        Patient.objects.filter(condition)
+        .annotate(name_prefix=Case(When(name__istartswith=terms[0], then=0), default=1, output_field=IntegerField()))
+        .order_by('name_prefix', '-id')
+        .values_list('id', flat=True)[:limit]
+    )
+
+
+def _has_fts_table(connection):
+    key = (connection.alias, connection.settings_dict['NAME'])
+    if key not in _fts_tables:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+                found = cursor.fetchone() is not None
+        except DatabaseError:
+            found = False
+        if not found:
+            # Don't remember a miss: the migration may not have run yet
+            return False
+        _fts_tables[key] = True
+    return _fts_tables[key]
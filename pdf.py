@@ -0,0 +1,137 @@
+"""A minimal, dependency-free PDF writer for text documents.
+
+Only the standard Helvetica fonts are used, which every PDF viewer ships,
+so nothing is embedded and no third-party package is needed. Text is
+encoded as WinAnsi (cp1252); characters outside it are replaced.
+"""
+import datetime
+import zlib
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 56
+
+# Helvetica advance widths for ASCII 32-126, in 1/1000 em
+_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+# Helvetica-Bold is slightly wider; scaling keeps wrapped bold lines inside the margin
+_BOLD_SCALE = 1.1
+
+_FONTS = {'regular': ('F1', 'Helvetica'), 'bold': ('F2', 'Helvetica-Bold')}
+
+
+def text_width(text, size, bold=False):
+    width = sum(_WIDTHS[ord(char) - 32] if 32 <= ord(char) <= 126 else 556 for char in text)
+    return width * size / 1000 * (_BOLD_SCALE if bold else 1)
+
+
+def wrap(text, size, width, bold=False):
+    """Split ``text`` into lines no wider than ``width`` points, breaking at spaces"""
+    lines = []
+    for paragraph in str(text).splitlines() or ['']:
+        line = ''
+        for word in paragraph.split(' '):
+            candidate = f'{line} {word}' if line else word
+            if line and text_width(candidate, size, bold) > width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+    return lines
+
+
+def _escape(text):
+    data = text.encode('cp1252', 'replace')
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+class PDFDocument:
+    """Lay out headings and paragraphs top to bottom, starting new pages as needed"""
+
+    def __init__(self, title=''):
+        self.title = title
+        self.pages = []
+        self._new_page()
+
+    def heading(self, text, size=16):
+        self._space(size * 0.6)
+        self.text(text, size=size, bold=True)
+        self._space(size * 0.2)
+
+    def text(self, text, size=10, bold=False, indent=0):
+        leading = size * 1.35
+        for line in wrap(text, size, PAGE_WIDTH - 2 * MARGIN - indent, bold):
+            if self._y - leading < MARGIN:
+                self._new_page()
+            self._y -= leading
+            font = _FONTS['bold' if bold else 'regular'][0]
+            self._page.append(
+                b'BT /%s %g Tf %g %g Td (%s) Tj ET' % (font.encode(), size, MARGIN + indent, self._y, _escape(line))
+            )
+
+    def field(self, label, value, size=10):
+        self.text(f'{label}: {value}', size=size)
+
+    def rule(self):
+        self._space(4)
+        self._page.append(b'0.75 G %g %g m %g %g l S 0 G' % (MARGIN, self._y, PAGE_WIDTH - MARGIN, self._y))
+        self._space(4)
+
+    def build(self):
+        """Return the document as PDF bytes"""
+        objects = []
+
+        def add(body):
+            objects.append(body)
+            return len(objects)
+
+        catalog = add(None)
+        pages = add(None)
+        fonts = {
+            key: add(b'<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>' % name.encode())
+            for key, name in _FONTS.values()
+        }
+        resources = b'<< /Font << %s >> >>' % b' '.join(
+            b'/%s %d 0 R' % (key.encode(), number) for key, number in fonts.items()
+        )
+        kids = []
+        for content in self.pages:
+            stream = zlib.compress(b'\n'.join(content))
+            contents = add(b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(stream), stream))
+            kids.append(add(
+                b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources %s /Contents %d 0 R >>'
+                % (pages, PAGE_WIDTH, PAGE_HEIGHT, resources, contents)
+            ))
+        objects[catalog - 1] = b'<< /Type /Catalog /Pages %d 0 R >>' % pages
+        objects[pages - 1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            b' '.join(b'%d 0 R' % kid for kid in kids), len(kids))
+        info = add(b'<< /Title (%s) /Producer (Health Predictor) /CreationDate (D:%s) >>' % (
+            _escape(self.title), datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%d%H%M%SZ').encode()))
+
+        output = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(len(output))
+            output += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+        xref = len(output)
+        output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        output += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+        output += b'trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+            len(objects) + 1, catalog, info, xref)
+        return bytes(output)
+
+    def _new_page(self):
+        self._page = []
+        self.pages.append(self._page)
+        self._y = PAGE_HEIGHT - MARGIN
+
+    def _space(self, points):
+        self._y -= points
+        if self._y < MARGIN:
+            self._new_page()
@@ -0,0 +1,418 @@
+"""Disease prediction engine.
+
+This module has no Django imports so that both the Django views and the
+Streamlit app can share it. Batch and weighted scoring use NumPy and
+SciPy, which are imported on first use.
+
+Every ranking returns the top ``limit`` diseases through bounded
+selection rather than a full sort. Equal scores go to the disease with
+the higher severity level, then to the earlier catalog position.
+"""
+
+import heapq
+
+SCORING_MODES = ('count', 'match', 'weighted')
+
+# Multipliers for how long a symptom has lasted, covering both the Django
+# SymptomSeverityForm choices and the Streamlit duration options.
+DURATION_WEIGHTS = {
+    'hours': 0.8,
+    'days': 1.0,
+    'weeks': 1.2,
+    'months': 1.4,
+    'years': 1.5,
+    'Less than a day': 0.8,
+    '1-3 days': 1.0,
+    '4-7 days': 1.1,
+    '1-2 weeks': 1.2,
+    'More than 2 weeks': 1.3,
+}
+
+
+try:
+    _popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def _popcount(value):
+        return bin(value).count('1')
+
+
+def _load_sparse():
+    """Import NumPy and scipy.sparse for batch scoring"""
+    try:
+        import numpy
+        from scipy import sparse
+    except ImportError as exc:
+        raise ImportError("Batch scoring requires NumPy and SciPy to be installed") from exc
+    return numpy, sparse
+
+
+def _iter_bits(value):
+    """Yield the positions of the set bits in ``value``, lowest first"""
+    # Scanning the binary string stays linear for masks with tens of
+    # thousands of bits, where repeatedly clearing the lowest bit does not.
+    digits = bin(value)[:1:-1]
+    position = digits.find('1')
+    while position >= 0:
+        yield position
+        position = digits.find('1', position + 1)
+
+
+def check_symptom_data(data):
+    """Raise ValueError unless ``data`` holds a 1-10 ``severity`` and a known ``duration``.
+
+    Either key may be left out, in which case :func:`symptom_weight` uses
+    its defaults.
+    """
+    severity = data.get('severity', 5)
+    if isinstance(severity, bool) or not isinstance(severity, (int, float)) or not 1 <= severity <= 10:
+        raise ValueError('"severity" must be a number from 1 to 10')
+    duration = data.get('duration')
+    if duration is not None and duration not in DURATION_WEIGHTS:
+        raise ValueError(f'"duration" must be one of: {", ".join(DURATION_WEIGHTS)}')
+
+
+def symptom_weight(severity, duration, severity_level):
+    """Weight of one reported symptom in weighted scoring.
+
+    Combines the patient's 1-10 severity rating, the duration bucket and
+    the catalog ``Symptom.severity_level``.
+    """
+    return (severity / 10) * DURATION_WEIGHTS.get(duration, 1.0) * (1 + severity_level / 10)
+
+
+def disease_weight(severity_level):
+    """Multiplier applied to a disease's weighted score for its severity level"""
+    return 1 + severity_level / 10
+
+
+class SymptomIndex:
+    """Process-local bitset index of every disease's symptom set.
+
+    Each symptom is assigned a bit position and each disease is stored as
+    an integer mask of its symptoms, so the overlap between a request and a
+    disease is a single ``&`` followed by a popcount. A posting mask per
+    symptom (one bit per disease) narrows scoring down to the diseases that
+    share at least one symptom with the request.
+    """
+
+    def __init__(self, diseases, symptom_levels=None):
+        """Build the index from ``(disease_id, symptom_ids, severity_level)`` rows.
+
+        ``symptom_levels`` optionally maps symptom ids to their catalog
+        severity level for weighted scoring; missing symptoms count as 1.
+        """
+        symptom_levels = symptom_levels or {}
+        self._symptom_bits = {}
+        self._symptom_levels = []
+        self._postings = []
+        self.disease_ids = []
+        self.masks = []
+        self.sizes = []
+        self.severity_levels = []
+        self._incidence = None
+        self._symptom_matrix = None
+        self._weighted_matrix = None
+
+        for position, (disease_id, symptom_ids, severity_level) in enumerate(diseases):
+            mask = 0
+            for symptom_id in symptom_ids:
+                bit = self._symptom_bits.get(symptom_id)
+                if bit is None:
+                    bit = self._symptom_bits[symptom_id] = len(self._postings)
+                    self._postings.append(0)
+                    self._symptom_levels.append(symptom_levels.get(symptom_id, 1))
+                mask |= 1 << bit
+                self._postings[bit] |= 1 << position
+
+            self.disease_ids.append(disease_id)
+            self.masks.append(mask)
+            self.sizes.append(_popcount(mask))
+            self.severity_levels.append(severity_level)
+
+    def __len__(self):
+        return len(self.disease_ids)
+
+    def symptom_mask(self, symptom_ids):
+        """Return the symptom mask for ``symptom_ids``, ignoring unknown ids"""
+        mask = 0
+        for symptom_id in symptom_ids:
+            bit = self._symptom_bits.get(symptom_id)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def symptom_weights(self, symptom_data):
+        """Return ``{bit: weight}`` for a ``{symptom_id: {'severity', 'duration'}}`` mapping.
+
+        Keys may be strings, as they are after a round trip through the
+        session. Unknown symptoms are ignored.
+        """
+        weights = {}
+        for symptom_id, data in symptom_data.items():
+            bit = self._symptom_bits.get(int(symptom_id))
+            if bit is not None:
+                weights[bit] = symptom_weight(
+                    data.get('severity', 5), data.get('duration'), self._symptom_levels[bit]
+                )
+        return weights
+
+    def matches(self, symptom_ids):
+        """Return ``(position, matched_count)`` for each disease sharing a symptom"""
+        query = self.symptom_mask(symptom_ids)
+        if not query:
+            return []
+
+        candidates = 0
+        for bit in _iter_bits(query):
+            candidates |= self._postings[bit]
+
+        masks = self.masks
+        return [(position, _popcount(masks[position] & query)) for position in _iter_bits(candidates)]
+
+    def rank(self, query, limit=5, mode='count'):
+        """Rank diseases for one request with the given scoring ``mode``.
+
+        ``query`` is an iterable of symptom ids, or for ``'weighted'`` a
+        ``{symptom_id: {'severity', 'duration'}}`` mapping.
+        """
+        if mode == 'count':
+            return self.rank_by_count(query, limit=limit)
+        if mode == 'match':
+            return self.rank_by_match(query, limit=limit)
+        if mode == 'weighted':
+            return self.rank_weighted(query, limit=limit)
+        raise ValueError(f"Unknown ranking mode: {mode!r}")
+
+    def top(self, scored, limit=5):
+        """Select the ``limit`` best ``(position, score)`` pairs from ``scored``.
+
+        Uses a bounded heap, so the cost is O(n log k) in the number of
+        candidates. Returns ``(disease_id, score)`` pairs, best first.
+        """
+        severity_levels = self.severity_levels
+        best = heapq.nsmallest(
+            limit, scored, key=lambda item: (-item[1], -severity_levels[item[0]], item[0])
+        )
+        return [(self.disease_ids[position], score) for position, score in best]
+
+    def rank_by_count(self, symptom_ids, limit=5):
+        """Rank diseases by matched symptom count.
+
+        Returns ``(disease_id, matched_count)`` pairs, mirroring the
+        ``symptom_count`` annotation the Django view used to compute.
+        """
+        return self.top(self.matches(symptom_ids), limit)
+
+    def rank_by_match(self, symptom_ids, limit=5):
+        """Rank diseases by the percentage of their symptoms that matched.
+
+        Returns ``(disease_id, percentage)`` pairs.
+        """
+        sizes = self.sizes
+        return self.top(
+            ((position, matched / sizes[position] * 100) for position, matched in self.matches(symptom_ids)),
+            limit,
+        )
+
+    def rank_weighted(self, symptom_data, limit=5):
+        """Rank diseases by severity- and duration-weighted symptom overlap.
+
+        The score is the dot product of the request's symptom weights with
+        the disease's row of the weighted incidence matrix. Returns
+        ``(disease_id, score)`` pairs.
+        """
+        weights = self.symptom_weights(symptom_data)
+        if not weights:
+            return []
+
+        try:
+            np, sparse = _load_sparse()
+        except ImportError:
+            scores = {}
+            for bit, weight in weights.items():
+                for position in _iter_bits(self._postings[bit]):
+                    scores[position] = scores.get(position, 0.0) + weight
+            scored = [
+                (position, score * disease_weight(self.severity_levels[position]))
+                for position, score in scores.items()
+            ]
+        else:
+            bits = list(weights)
+            vector = sparse.csr_matrix(
+                (list(weights.values()), ([0] * len(bits), bits)),
+                shape=(1, len(self._postings)),
+            )
+            result = vector @ self.weighted_matrix()
+            scored = list(zip(result.indices.tolist(), result.data.tolist()))
+
+        return self.top(scored, limit)
+
+    def incidence_matrix(self):
+        """Return the diseases x symptoms incidence matrix as a CSR matrix"""
+        if self._incidence is None:
+            np, sparse = _load_sparse()
+            indptr = np.zeros(len(self.masks) + 1, dtype=np.int64)
+            np.cumsum(self.sizes, out=indptr[1:])
+            indices = np.fromiter(
+                (bit for mask in self.masks for bit in _iter_bits(mask)),
+                dtype=np.int32,
+                count=int(indptr[-1]),
+            )
+            data = np.ones(len(indices), dtype=np.int32)
+            self._incidence = sparse.csr_matrix(
+                (data, indices, indptr),
+                shape=(len(self.masks), len(self._postings)),
+            )
+        return self._incidence
+
+    def symptom_matrix(self):
+        """Return the symptoms x diseases incidence matrix as a CSR matrix"""
+        if self._symptom_matrix is None:
+            self._symptom_matrix = self.incidence_matrix().T.tocsr()
+        return self._symptom_matrix
+
+    def weighted_matrix(self):
+        """Return the symptoms x diseases matrix scaled by each disease's weight"""
+        if self._weighted_matrix is None:
+            np, sparse = _load_sparse()
+            matrix = self.symptom_matrix().astype(np.float64)
+            disease_weights = disease_weight(np.asarray(self.severity_levels, dtype=np.float64))
+            matrix.data *= disease_weights[matrix.indices]
+            self._weighted_matrix = matrix
+        return self._weighted_matrix
+
+    def rank_batch(self, queries, limit=5, mode='count'):
+        """Rank diseases for many requests with one sparse matrix product.
+
+        Each query is what :meth:`rank` takes for the same ``mode``. Returns
+        one list of ``(disease_id, score)`` pairs per query, in input order,
+        ranked exactly as :meth:`rank` would.
+        """
+        if mode not in SCORING_MODES:
+            raise ValueError(f"Unknown ranking mode: {mode!r}")
+
+        np, sparse = _load_sparse()
+        queries = list(queries)
+        total = len(queries)
+
+        rows, columns, values = [], [], []
+        if mode == 'weighted':
+            for row, symptom_data in enumerate(queries):
+                for bit, weight in self.symptom_weights(symptom_data).items():
+                    rows.append(row)
+                    columns.append(bit)
+                    values.append(weight)
+            matrix = self.weighted_matrix()
+        else:
+            symptom_bits = self._symptom_bits
+            for row, symptom_ids in enumerate(queries):
+                for symptom_id in set(symptom_ids):
+                    bit = symptom_bits.get(symptom_id)
+                    if bit is not None:
+                        rows.append(row)
+                        columns.append(bit)
+            values = np.ones(len(rows), dtype=np.int32)
+            matrix = self.symptom_matrix()
+
+        request_matrix = sparse.csr_matrix((values, (rows, columns)), shape=(total, len(self._postings)))
+        results = request_matrix @ matrix
+        positions = results.indices
+        disease_count = len(self)
+        sizes = np.maximum(np.asarray(self.sizes, dtype=np.int64), 1)
+
+        # ``tiebreak`` ranks diseases by severity level, then catalog order,
+        # so that larger is better and every disease gets a distinct value.
+        order = np.lexsort((np.arange(disease_count), -np.asarray(self.severity_levels)))
+        tiebreak = np.empty(disease_count, dtype=np.int64)
+        tiebreak[order] = np.arange(disease_count - 1, -1, -1)
+
+        # Fold each ranking into one key per (row, disease) where larger is
+        # better. Count and match keys are integers that also encode the
+        # tie-break, so they are unique within a row. Match percentages are
+        # compared exactly as matched * S**2 // size, since two distinct
+        # fractions with denominators <= S differ by at least 1 / S**2.
+        if mode == 'count':
+            matched = results.data.astype(np.int64)
+            keys = matched * disease_count + tiebreak[positions]
+            scores = matched
+        elif mode == 'match':
+            matched = results.data.astype(np.int64)
+            scale = int(sizes.max(initial=1)) ** 2
+            keys = (matched * scale // sizes[positions]) * disease_count
+            keys += tiebreak[positions]
+            scores = matched / sizes[positions] * 100
+        else:
+            keys = results.data.copy()
+            scores = results.data
+
+        # Pull the best remaining entry from every row ``limit`` times
+        # instead of sorting every match. Weighted keys can tie, in which
+        # case the larger tie-break wins.
+        lengths = np.diff(results.indptr)
+        non_empty = np.flatnonzero(lengths)
+        starts = results.indptr[:-1][non_empty]
+        picked = np.full((total, limit), -1, dtype=np.int64)
+        for rank in range(limit if len(keys) else 0):
+            best = np.maximum.reduceat(keys, starts)
+            hits = np.flatnonzero(keys == np.repeat(best, lengths[non_empty]))
+            hits = hits[keys[hits] >= 0]
+            if not len(hits):
+                break
+            hit_rows = np.searchsorted(results.indptr, hits, side='right') - 1
+            group_starts = np.flatnonzero(np.r_[True, hit_rows[1:] != hit_rows[:-1]])
+            if len(group_starts) < len(hits):
+                hit_tiebreaks = tiebreak[positions[hits]]
+                best_tiebreaks = np.maximum.reduceat(hit_tiebreaks, group_starts)
+                keep = hit_tiebreaks == np.repeat(best_tiebreaks, np.diff(np.r_[group_starts, len(hits)]))
+                hits, hit_rows = hits[keep], hit_rows[keep]
+            picked[hit_rows, rank] = hits
+            keys[hits] = -1
+
+        valid = picked >= 0
+        entries = picked[valid]
+        disease_ids = np.asarray(self.disease_ids, dtype=object)[positions[entries]].tolist()
+        scores = scores[entries].tolist()
+
+        bounds = np.concatenate(([0], np.cumsum(valid.sum(axis=1)))).tolist()
+        return [
+            list(zip(disease_ids[start:end], scores[start:end]))
+            for start, end in zip(bounds, bounds[1:])
+        ]
+
+
+class RemedyIndex:
+    """Inverted index from diseases and symptoms to remedies.
+
+    Every posting list is sorted by effectiveness rating (highest first,
+    then catalog order), so a recommendation is a k-way merge of the few
+    lists a request touches rather than a scan of every remedy.
+    """
+
+    def __init__(self, remedies):
+        """Build the index from ``(remedy_id, effectiveness_rating, disease_ids, symptom_ids)`` rows"""
+        by_disease = {}
+        by_symptom = {}
+        for position, (remedy_id, rating, disease_ids, symptom_ids) in enumerate(remedies):
+            posting = (-rating, position, remedy_id)
+            for disease_id in disease_ids:
+                by_disease.setdefault(disease_id, []).append(posting)
+            for symptom_id in symptom_ids:
+                by_symptom.setdefault(symptom_id, []).append(posting)
+
+        self._by_disease = {key: tuple(sorted(postings)) for key, postings in by_disease.items()}
+        self._by_symptom = {key: tuple(sorted(postings)) for key, postings in by_symptom.items()}
+
+    def recommend(self, disease_ids, symptom_ids, limit=None):
+        """Return ids of remedies for any of the diseases or symptoms, most effective first"""
+        postings = [self._by_disease[key] for key in set(disease_ids) if key in self._by_disease]
+        postings += [self._by_symptom[key] for key in set(symptom_ids) if key in self._by_symptom]
+
+        seen = set()
+        recommended = []
+        for _, _, remedy_id in heapq.merge(*postings):
+            if remedy_id not in seen:
+                seen.add(remedy_id)
+                recommended.append(remedy_id)
+                if limit is not None and len(recommended) >= limit:
+                    break
+        return recommended
@@ -0,0 +1,97 @@
+"""CSV export of reports, produced row by row so memory stays flat"""
+import csv
+import datetime
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import Disease, Remedy, Report, Symptom
+
+BULK_HEADER = [
+    'uuid', 'title', 'patient', 'status', 'created_at',
+    'symptoms', 'predicted_conditions', 'recommended_remedies', 'notes',
+]
+
+
+class Echo:
+    """A file-like object whose ``write`` hands the CSV line back instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    """Yield each row of ``rows`` as one CSV-encoded line"""
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def export_queryset(queryset=None):
+    """Reports with their patient and links loaded, each link with only the columns written"""
+    queryset = Report.objects.all() if queryset is None else queryset
+    return queryset.select_related('patient').prefetch_related(
+        Prefetch('symptoms', queryset=Symptom.objects.only('name', 'description')),
+        Prefetch('predicted_diseases', queryset=Disease.objects.only('name', 'description')),
+        Prefetch('recommended_remedies', queryset=Remedy.objects.only('name', 'remedy_type', 'description')),
+    )
+
+
+def report_rows(report):
+    """Rows of the single-report export; ``report`` should come from :func:`export_queryset`"""
+    yield ['Health Report', report.title]
+    yield ['Patient', report.patient.name]
+    yield ['Date', report.created_at.strftime('%Y-%m-%d')]
+    yield []
+
+    yield ['Symptoms']
+    for symptom in report.symptoms.all():
+        yield [symptom.name, symptom.description]
+    yield []
+
+    yield ['Predicted Conditions']
+    for disease in report.predicted_diseases.all():
+        yield [disease.name, disease.description]
+    yield []
+
+    yield ['Recommended Remedies']
+    for remedy in report.recommended_remedies.all():
+        yield [remedy.name, remedy.get_remedy_type_display(), remedy.description]
+
+
+def filter_reports(patient=None, status=None, start=None, end=None):
+    """Reports of ``patient`` with ``status``, created from ``start`` to ``end`` inclusive (dates)"""
+    queryset = Report.objects.all()
+    if patient:
+        queryset = queryset.filter(patient_id=patient)
+    if status:
+        queryset = queryset.filter(status=status)
+    # Compare against datetimes rather than created_at__date so the index is usable
+    if start:
+        queryset = queryset.filter(created_at__gte=_start_of_day(start))
+    if end:
+        queryset = queryset.filter(created_at__lt=_start_of_day(end + datetime.timedelta(days=1)))
+    return queryset
+
+
+def bulk_rows(queryset, chunk_size=500):
+    """Yield the header, then one row per report, loading ``chunk_size`` reports and their links at a time"""
+    yield BULK_HEADER
+    for report in export_queryset(queryset).order_by('id').iterator(chunk_size=chunk_size):
+        yield [
+            report.uuid,
+            report.title,
+            report.patient.name,
+            report.status,
+            report.created_at.isoformat(),
+            '; '.join(symptom.name for symptom in report.symptoms.all()),
+            '; '.join(disease.name for disease in report.predicted_diseases.all()),
+            '; '.join(remedy.name for remedy in report.recommended_remedies.all()),
+            report.notes or '',
+        ]
+
+
+def _start_of_day(date):
+    value = datetime.datetime.combine(date, datetime.time.min)
+    return timezone.make_aware(value) if settings.USE_TZ else value
@@ -0,0 +1,127 @@
+"""PDF rendering of reports, cached on disk per report revision.
+
+A rendered file is named after the report's uuid and ``updated_at``, so
+editing a report makes the next download render a fresh file while
+unchanged reports are served straight from disk. ``REPORT_PDF_CACHE['DIR']``
+sets the directory; by default it is ``report_pdfs`` under ``MEDIA_ROOT``.
+The files hold patient data, so with neither setting there is no shared
+temporary directory to fall back to and the cache refuses to start.
+"""
+import glob
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Prefetch
+
+from .models import Disease, Remedy, Report, Symptom
+from .pdf import PDFDocument
+
+
+def pdf_queryset(queryset=None):
+    """Reports with their patient and every link column the PDF prints, in four queries"""
+    queryset = Report.objects.all() if queryset is None else queryset
+    return queryset.select_related('patient').prefetch_related(
+        Prefetch('symptoms', queryset=Symptom.objects.only('name', 'body_part')),
+        Prefetch('predicted_diseases', queryset=Disease.objects.only('name', 'description')),
+        Prefetch('recommended_remedies', queryset=Remedy.objects.only(
+            'name', 'remedy_type', 'description', 'instructions')),
+    )
+
+
+def render_report_pdf(report):
+    """Return the PDF bytes for ``report``, laid out like the report detail page.
+
+    ``report`` should come from :func:`pdf_queryset` so its patient and
+    links are already loaded.
+    """
+    document = PDFDocument(report.title)
+    document.heading(report.title, size=18)
+    document.field('Status', report.get_status_display())
+    document.field('Patient', f'{report.patient.name}, {report.patient.age}, {report.patient.get_gender_display()}')
+    document.field('Created', report.created_at.strftime('%B %d, %Y, %H:%M'))
+    document.field('Last Updated', report.updated_at.strftime('%B %d, %Y, %H:%M'))
+    document.field('Report ID', report.uuid)
+
+    if report.notes:
+        document.heading('Notes', size=13)
+        document.text(report.notes)
+
+    document.heading('Symptoms', size=13)
+    symptoms = list(report.symptoms.all())
+    for symptom in symptoms:
+        document.text(f'{symptom.name} ({symptom.body_part or "General"})', indent=8)
+    if not symptoms:
+        document.text('No symptoms recorded.')
+
+    document.heading('Predicted Conditions', size=13)
+    diseases = list(report.predicted_diseases.all())
+    for disease in diseases:
+        document.text(disease.name, bold=True)
+        document.text(disease.description, indent=8)
+    if not diseases:
+        document.text('No conditions predicted.')
+
+    document.heading('Recommended Remedies', size=13)
+    remedies = list(report.recommended_remedies.all())
+    for remedy in remedies:
+        document.text(f'{remedy.name} ({remedy.get_remedy_type_display()})', bold=True)
+        document.text(remedy.description, indent=8)
+        if remedy.instructions:
+            document.text(f'Instructions: {remedy.instructions}', indent=8)
+    if not remedies:
+        document.text('No remedies recommended.')
+
+    document.rule()
+    document.text('This report is for information only and is not a medical diagnosis.', size=8)
+    return document.build()
+
+
+class ReportPDFCache:
+    """Rendered report PDFs stored as ``<uuid>-<updated_at>.pdf`` files"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @classmethod
+    def from_settings(cls):
+        directory = getattr(settings, 'REPORT_PDF_CACHE', {}).get('DIR')
+        if not directory:
+            if not getattr(settings, 'MEDIA_ROOT', ''):
+                raise ImproperlyConfigured("Set REPORT_PDF_CACHE['DIR'] or MEDIA_ROOT to cache report PDFs.")
+            directory = os.path.join(settings.MEDIA_ROOT, 'report_pdfs')
+        return cls(directory)
+
+    def path_for(self, report):
+        """Where the current revision of ``report`` is, or would be, cached"""
+        revision = report.updated_at.strftime('%Y%m%dT%H%M%S%f')
+        return os.path.join(self.directory, f'{report.uuid}-{revision}.pdf')
+
+    def get(self, report):
+        """Return the cached file's path, or None; only ``uuid`` and ``updated_at`` are read"""
+        path = self.path_for(report)
+        return path if os.path.exists(path) else None
+
+    def render(self, report):
+        """Render ``report``, store it and return the path, dropping files of older revisions"""
+        path = self.path_for(report)
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        data = render_report_pdf(report)
+        # Write to a temporary name first so readers never see a partial file
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as stream:
+            stream.write(data)
+        os.replace(temporary, path)
+
+        for stale in glob.glob(os.path.join(self.directory, f'{report.uuid}-*.pdf')):
+            if stale != path:
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+        return path
+
+
+def get_report_pdf_cache():
+    return ReportPDFCache.from_settings()
@@ -0,0 +1,236 @@
+"""Write-behind queue for reports created while showing prediction results.
+
+With ``REPORT_WRITE_BEHIND['ENABLED']`` set, the results view hands its
+report to :func:`get_report_queue` instead of writing it inline. A daemon
+thread drains the queue in batches through
+:func:`report_writer.write_reports`. The queue is flushed when the process
+exits normally, so a graceful shutdown never drops a queued report.
+A report that fails to write is retried with backoff; one that still
+fails is kept in ``failed_drafts`` for :meth:`ReportQueue.retry_failed`.
+"""
+import atexit
+import logging
+import queue
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection
+
+from .report_writer import write_reports
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'BATCH_SIZE': 100,
+    'MAX_QUEUE': 10000,
+    'FLUSH_INTERVAL': 0.5,
+    'RETRIES': 3,
+    'RETRY_DELAY': 0.5,
+}
+
+
+def write_behind_enabled():
+    return dict(DEFAULTS, **getattr(settings, 'REPORT_WRITE_BEHIND', {}))['ENABLED']
+
+
+class ReportQueue:
+    """Bounded queue of ReportDrafts drained by one background thread"""
+
+    def __init__(self, batch_size=100, max_size=10000, flush_interval=0.5, retries=3, retry_delay=0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.failed_drafts = []
+        self._queue = queue.Queue(max_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self.in_flight = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    @classmethod
+    def from_settings(cls):
+        options = dict(DEFAULTS, **getattr(settings, 'REPORT_WRITE_BEHIND', {}))
+        return cls(
+            batch_size=options['BATCH_SIZE'],
+            max_size=options['MAX_QUEUE'],
+            flush_interval=options['FLUSH_INTERVAL'],
+            retries=options['RETRIES'],
+            retry_delay=options['RETRY_DELAY'],
+        )
+
+    def put(self, draft):
+        """Queue ``draft`` for writing, or write it now if the queue is full or stopped"""
+        if not self._stopping.is_set():
+            self._ensure_worker()
+            try:
+                self._queue.put_nowait(draft)
+                return
+            except queue.Full:
+                pass
+        # Back-pressure: the caller pays for the write rather than losing it
+        self._write([draft])
+
+    def depth(self):
+        """Number of reports queued or being written"""
+        return self.stats()['depth']
+
+    def flush(self):
+        """Block until every queued report has been written"""
+        self._queue.join()
+
+    def close(self):
+        """Stop accepting work, write everything still queued and stop the worker"""
+        self._stopping.set()
+        if self._thread is not None:
+            try:
+                self._queue.put_nowait(None)  # wake an idle worker
+            except queue.Full:
+                pass
+            self._thread.join()
+        # Anything queued after the worker last looked
+        self._drain()
+
+    def retry_failed(self):
+        """Queue the reports that could not be written again; returns how many"""
+        with self._lock:
+            drafts, self.failed_drafts = self.failed_drafts, []
+        for draft in drafts:
+            self.put(draft)
+        return len(drafts)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'depth': self._queue.qsize() + self.in_flight,
+                'written': self.written,
+                'failed': self.failed,
+                'held': len(self.failed_drafts),
+                'batches': self.batches,
+                'batch_size': self.batch_size,
+                'max_queue': self._queue.maxsize,
+                'running': self._thread is not None and self._thread.is_alive(),
+            }
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='report-write-behind', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stopping.is_set():
+                self._drain(timeout=self.flush_interval)
+            self._drain()
+        finally:
+            connection.close()
+
+    def _drain(self, timeout=None):
+        """Write batches until the queue is empty, waiting up to ``timeout`` for the first one"""
+        while True:
+            try:
+                first = self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait()
+            except queue.Empty:
+                return
+            timeout = None
+
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            drafts = [draft for draft in batch if draft is not None]
+            with self._lock:
+                self.in_flight = len(drafts)
+            try:
+                if drafts:
+                    close_old_connections()
+                    self._write(drafts)
+            finally:
+                with self._lock:
+                    self.in_flight = 0
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, drafts):
+        if len(drafts) == 1:
+            self._write_one(drafts[0])
+            return
+        try:
+            write_reports(drafts, batch_size=self.batch_size)
+        except Exception:
+            # One bad draft (say, a deleted patient) must not cost the rest
+            # of the batch, so retry them one at a time.
+            for draft in drafts:
+                self._write_one(draft)
+            return
+        with self._lock:
+            self.written += len(drafts)
+            self.batches += 1
+
+    def _write_one(self, draft):
+        """Write ``draft``, retrying with doubling delays; hold on to it if every attempt fails"""
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                write_reports([draft])
+            except IntegrityError:
+                # It points at a row that no longer exists; retrying cannot help
+                error = sys.exc_info()
+                break
+            except Exception:
+                error = sys.exc_info()
+                if attempt < self.retries:
+                    time.sleep(delay)
+                    delay *= 2
+                continue
+            with self._lock:
+                self.written += 1
+                self.batches += 1
+            return
+        logger.error('Could not write report for patient %s', draft.patient_id, exc_info=error)
+        with self._lock:
+            self.failed += 1
+            self.failed_drafts.append(draft)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def report_queue_stats():
+    """Stats of the process-wide queue; zeros, without creating the queue, when write-behind is off"""
+    if write_behind_enabled():
+        return get_report_queue().stats()
+    options = dict(DEFAULTS, **getattr(settings, 'REPORT_WRITE_BEHIND', {}))
+    return {
+        'depth': 0,
+        'written': 0,
+        'failed': 0,
+        'held': 0,
+        'batches': 0,
+        'batch_size': options['BATCH_SIZE'],
+        'max_queue': options['MAX_QUEUE'],
+        'running': False,
+    }
+
+
+def get_report_queue():
+    """Return the process-wide ReportQueue, configured from settings"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = ReportQueue.from_settings()
+                atexit.register(_queue.close)
+    return _queue
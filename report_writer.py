@@ -0,0 +1,81 @@
+"""Persist reports and their symptom, disease and remedy links in bulk"""
+from typing import NamedTuple, Optional, Sequence
+from uuid import UUID
+
+from django.db import transaction
+
+from .dashboard import get_dashboard_metrics
+from .models import Report
+from .rollups import record_reports_created
+
+
+class ReportDraft(NamedTuple):
+    """Everything needed to write one report"""
+    patient_id: int
+    title: str
+    symptom_ids: Sequence[int] = ()
+    disease_ids: Sequence[int] = ()
+    remedy_ids: Sequence[int] = ()
+    status: str = 'DRAFT'
+    notes: Optional[str] = None
+    uuid: Optional[UUID] = None
+
+
+_LINKS = (
+    (Report.symptoms.through, 'symptom_id', 'symptom_ids'),
+    (Report.predicted_diseases.through, 'disease_id', 'disease_ids'),
+    (Report.recommended_remedies.through, 'remedy_id', 'remedy_ids'),
+)
+
+
+def write_reports(drafts, batch_size=500):
+    """Write many reports and their links in one transaction.
+
+    Issues one INSERT per table per ``batch_size`` rows, no matter how many
+    links each report has. Returns the saved Report objects in input order.
+    """
+    drafts = list(drafts)
+    if not drafts:
+        return []
+
+    reports = [
+        Report(
+            patient_id=draft.patient_id,
+            title=draft.title,
+            status=draft.status,
+            notes=draft.notes,
+            **({'uuid': draft.uuid} if draft.uuid else {}),
+        )
+        for draft in drafts
+    ]
+
+    with transaction.atomic():
+        Report.objects.bulk_create(reports, batch_size=batch_size)
+        if any(report.pk is None for report in reports):
+            # Backends that cannot return ids from a bulk insert
+            ids = dict(Report.objects.filter(
+                uuid__in=[report.uuid for report in reports]).values_list('uuid', 'id'))
+            for report in reports:
+                report.pk = ids[report.uuid]
+
+        for through, column, attribute in _LINKS:
+            through.objects.bulk_create(
+                [
+                    through(report_id=report.pk, **{column: target_id})
+                    for report, draft in zip(reports, drafts)
+                    # The through tables are unique per (report, target)
+                    for target_id in dict.fromkeys(getattr(draft, attribute))
+                ],
+                batch_size=batch_size,
+            )
+
+        # bulk_create sends no signals, so count the new reports here
+        record_reports_created(reports, [draft.disease_ids for draft in drafts])
+        transaction.on_commit(lambda: get_dashboard_metrics().reports_changed(len(reports)))
+    return reports
+
+
+def write_report(patient_id, title, symptom_ids=(), disease_ids=(), remedy_ids=(), status='DRAFT', notes=None):
+    """Write one report and its links in a single transaction"""
+    draft = ReportDraft(patient_id, title, symptom_ids, disease_ids, remedy_ids, status, notes)
+    return write_reports([draft])[0]
@@ -0,0 +1,143 @@
+"""Cache of prediction results keyed by canonical symptom set and scoring mode.
+
+Results live in an in-process LRU with a TTL. When
+``PREDICTION_CACHE['BACKEND']`` names an entry in ``CACHES``, that Django
+cache backend is used as a shared second tier, and a catalog version stored
+there lets every process see invalidations.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+VERSION_KEY = 'health_predictor:catalog_version'
+
+DEFAULTS = {
+    'MAX_ENTRIES': 1024,
+    'TTL': 300,
+    'BACKEND': None,
+}
+
+
+def make_key(symptom_ids, mode, limit, symptom_data=None):
+    """Return the canonical cache key for a prediction request.
+
+    The symptom ids are reduced to a sorted frozenset, so order and
+    duplicates do not matter. Weighted requests also key on each
+    symptom's severity and duration.
+    """
+    symptoms = tuple(sorted(frozenset(int(symptom_id) for symptom_id in symptom_ids)))
+    if mode == 'weighted':
+        symptom_data = symptom_data or {}
+        details = []
+        for symptom_id in symptoms:
+            data = symptom_data.get(str(symptom_id), symptom_data.get(symptom_id, {}))
+            details.append((symptom_id, data.get('severity'), data.get('duration')))
+        symptoms = tuple(details)
+    return (mode, limit, symptoms)
+
+
+class PredictionCache:
+    """Two-tier LRU/TTL cache with hit and miss counters"""
+
+    def __init__(self, max_entries=1024, ttl=300, backend=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+        self.hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls):
+        options = dict(DEFAULTS, **getattr(settings, 'PREDICTION_CACHE', {}))
+        backend = caches[options['BACKEND']] if options['BACKEND'] else None
+        return cls(max_entries=options['MAX_ENTRIES'], ttl=options['TTL'], backend=backend)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for ``key``, calling ``compute()`` on a miss"""
+        version = self.version()
+        local_key = (version, key)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(local_key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(local_key)
+                self.hits += 1
+                return entry[1]
+
+        value = None
+        if self.backend is not None:
+            value = self.backend.get(self._backend_key(version, key))
+
+        if value is None:
+            value = compute()
+            with self._lock:
+                self.misses += 1
+            if self.backend is not None:
+                self.backend.set(self._backend_key(version, key), value, self.ttl)
+        else:
+            with self._lock:
+                self.backend_hits += 1
+
+        with self._lock:
+            self._entries[local_key] = (now + self.ttl, value)
+            self._entries.move_to_end(local_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def version(self):
+        if self.backend is None:
+            return self._version
+        return self.backend.get_or_set(VERSION_KEY, 0, None)
+
+    def invalidate(self):
+        """Discard every cached result, in this process and in the shared tier"""
+        with self._lock:
+            self._entries.clear()
+            self._version += 1
+        if self.backend is not None:
+            try:
+                self.backend.incr(VERSION_KEY)
+            except ValueError:
+                self.backend.set(VERSION_KEY, 1, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.backend_hits + self.misses
+            return {
+                'hits': self.hits,
+                'backend_hits': self.backend_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.backend_hits) / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'shared_backend': self.backend is not None,
+            }
+
+    def _backend_key(self, version, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return f'health_predictor:prediction:{version}:{digest}'
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    """Return the process-wide PredictionCache, configured from settings"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PredictionCache.from_settings()
+    return _cache
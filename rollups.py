@@ -0,0 +1,191 @@
+"""Per-day patient, report and predicted-disease counts read by the dashboard.
+
+Counts are kept current incrementally: the signal handlers in
+``signals.py``, :func:`report_writer.write_reports` and
+:func:`patient_import.insert_patients` call the ``record_*`` functions
+here. The ``rebuild_rollups`` management command recomputes them from
+scratch.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyDiseaseStat, DailyPatientStat, DailyReportStat, Patient, Report
+
+PredictedDisease = Report.predicted_diseases.through
+
+
+def local_date(value):
+    """Return the local calendar date of a ``created_at`` value"""
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def _bump(model, deltas):
+    """Add ``deltas`` (``{lookup: delta}``) to the ``count`` of each matching rollup row"""
+    for lookup, delta in deltas.items():
+        if not delta:
+            continue
+        lookup = dict(lookup)
+        if model.objects.filter(**lookup).update(count=F('count') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(count=delta, **lookup)
+        except IntegrityError:
+            # Another writer created the row first
+            model.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def bump_reports(deltas):
+    """Apply ``{(date, status): delta}`` to the daily report counts"""
+    _bump(DailyReportStat, {(('date', date), ('status', status)): delta for (date, status), delta in deltas.items()})
+
+
+def bump_diseases(deltas):
+    """Apply ``{(date, disease_id): delta}`` to the daily disease counts"""
+    _bump(DailyDiseaseStat, {
+        (('date', date), ('disease_id', disease_id)): delta for (date, disease_id), delta in deltas.items()
+    })
+
+
+def bump_patients(deltas):
+    """Apply ``{date: delta}`` to the daily patient counts"""
+    _bump(DailyPatientStat, {(('date', date),): delta for date, delta in deltas.items()})
+
+
+def record_patients_created(created_at, count=1):
+    bump_patients({local_date(created_at): count})
+
+
+def record_patient_deleted(patient):
+    bump_patients({local_date(patient.created_at): -1})
+
+
+def record_reports_created(reports, disease_ids):
+    """Count newly written reports; ``disease_ids`` holds each report's predicted diseases"""
+    report_deltas = Counter()
+    disease_deltas = Counter()
+    for report, diseases in zip(reports, disease_ids):
+        date = local_date(report.created_at)
+        report_deltas[date, report.status] += 1
+        for disease_id in set(diseases):
+            disease_deltas[date, disease_id] += 1
+    bump_reports(report_deltas)
+    bump_diseases(disease_deltas)
+
+
+def record_status_change(report, old_status):
+    date = local_date(report.created_at)
+    bump_reports({(date, old_status): -1, (date, report.status): 1})
+
+
+def record_report_deleted(report, disease_ids):
+    date = local_date(report.created_at)
+    bump_reports({(date, report.status): -1})
+    bump_diseases({(date, disease_id): -1 for disease_id in set(disease_ids)})
+
+
+def record_predictions(report_ids, disease_ids, delta):
+    """Add ``delta`` for every (report, disease) pair in ``report_ids`` x ``disease_ids``"""
+    deltas = Counter()
+    for created_at in Report.objects.filter(pk__in=report_ids).values_list('created_at', flat=True):
+        date = local_date(created_at)
+        for disease_id in disease_ids:
+            deltas[date, disease_id] += delta
+    bump_diseases(deltas)
+
+
+def lock_rollups():
+    """Block incremental updates to the rollup tables until the current transaction ends.
+
+    PostgreSQL gets an explicit table lock that still allows reads. On
+    other backends the rebuild deletes every rollup row first, which holds
+    the write lock on SQLite and the row locks on InnoDB.
+    """
+    connection = connections[router.db_for_write(DailyReportStat)]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for model in (DailyReportStat, DailyDiseaseStat, DailyPatientStat):
+                cursor.execute(f'LOCK TABLE {connection.ops.quote_name(model._meta.db_table)} IN EXCLUSIVE MODE')
+
+
+def rebuild(chunk_size=10000, progress=None):
+    """Recompute every rollup row from the Patient and Report tables, ``chunk_size`` rows at a time.
+
+    Runs in one transaction that locks the rollup tables before scanning.
+    Writers that create or change patients and reports meanwhile wait on
+    their increment, so their rows are either counted by the scan or
+    added on top of the rebuilt rows, never lost. Readers see the old
+    rows until the rebuild commits. Returns the number of reports scanned.
+    """
+    with transaction.atomic():
+        lock_rollups()
+        DailyReportStat.objects.all().delete()
+        DailyDiseaseStat.objects.all().delete()
+        DailyPatientStat.objects.all().delete()
+
+        patient_counts = Counter()
+        last_id = 0
+        while True:
+            ids = list(Patient.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            for date, count in (
+                Patient.objects.filter(pk__gte=ids[0], pk__lte=ids[-1])
+                .annotate(date=TruncDate('created_at'))
+                .values('date').annotate(count=Count('pk')).order_by()
+                .values_list('date', 'count')
+            ):
+                patient_counts[date] += count
+
+        report_counts = Counter()
+        disease_counts = Counter()
+        last_id = 0
+        scanned = 0
+        while True:
+            ids = list(Report.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                break
+            id_range = {'pk__gte': ids[0], 'pk__lte': ids[-1]}
+            last_id = ids[-1]
+
+            for date, status, count in (
+                Report.objects.filter(**id_range)
+                .annotate(date=TruncDate('created_at'))
+                .values('date', 'status').annotate(count=Count('pk')).order_by()
+                .values_list('date', 'status', 'count')
+            ):
+                report_counts[date, status] += count
+
+            for date, disease_id, count in (
+                PredictedDisease.objects.filter(report_id__gte=ids[0], report_id__lte=ids[-1])
+                .annotate(date=TruncDate('report__created_at'))
+                .values('date', 'disease_id').annotate(count=Count('pk')).order_by()
+                .values_list('date', 'disease_id', 'count')
+            ):
+                disease_counts[date, disease_id] += count
+
+            scanned += len(ids)
+            if progress:
+                progress(scanned)
+
+        DailyReportStat.objects.bulk_create(
+            [DailyReportStat(date=date, status=status, count=count) for (date, status), count in report_counts.items()],
+            batch_size=1000,
+        )
+        DailyDiseaseStat.objects.bulk_create(
+            [
+                DailyDiseaseStat(date=date, disease_id=disease_id, count=count)
+                for (date, disease_id), count in disease_counts.items()
+            ],
+            batch_size=1000,
+        )
+        DailyPatientStat.objects.bulk_create(
+            [DailyPatientStat(date=date, count=count) for date, count in patient_counts.items()],
+            batch_size=1000,
+        )
+    return scanned
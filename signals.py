@@ -0,0 +1,114 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version, invalidate_snapshot
+from . import rollups
+from .dashboard import get_dashboard_metrics
+from .models import Disease, Patient, Remedy, Report, Symptom
+from .result_cache import get_prediction_cache
+
+
+@receiver(post_save, sender=Disease)
+@receiver(post_save, sender=Symptom)
+@receiver(post_delete, sender=Disease)
+@receiver(post_delete, sender=Symptom)
+@receiver(m2m_changed, sender=Disease.symptoms.through)
+@receiver(post_save, sender=Remedy)
+@receiver(post_delete, sender=Remedy)
+@receiver(m2m_changed, sender=Remedy.diseases.through)
+@receiver(m2m_changed, sender=Remedy.symptoms.through)
+def catalog_changed(sender, **kwargs):
+    """Retire the catalog snapshot and cached predictions, in every process, after any catalog change"""
+    if kwargs.get('action', '').startswith('pre_'):
+        return
+    # Other processes notice the new version once this transaction commits
+    bump_catalog_version()
+    invalidate_catalog()
+    # A snapshot rebuilt by another request before this transaction commits
+    # would still see the old rows, so retire it again once it has.
+    transaction.on_commit(invalidate_catalog)
+
+
+def invalidate_catalog():
+    invalidate_snapshot()
+    get_prediction_cache().invalidate()
+
+
+@receiver(post_init, sender=Report)
+def remember_report_status(sender, instance, **kwargs):
+    # Read __dict__ so a deferred status is not fetched just to remember it;
+    # report_saving fetches it only if a save writes the status
+    instance._rollup_status = instance.__dict__.get('status')
+
+
+@receiver(pre_save, sender=Report)
+def report_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Fetch the stored status of a report loaded with ``status`` deferred, if this save writes it"""
+    if (raw or instance._state.adding or instance._rollup_status is not None
+            or 'status' not in instance.__dict__ or (update_fields is not None and 'status' not in update_fields)):
+        return
+    instance._rollup_status = (
+        Report.objects.using(instance._state.db).filter(pk=instance.pk).values_list('status', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Report)
+def report_saved(sender, instance, created, raw=False, **kwargs):
+    """Count new reports, and moves between statuses, in the daily rollup"""
+    if raw:
+        return
+    if created:
+        rollups.record_reports_created([instance], [()])
+        transaction.on_commit(lambda: get_dashboard_metrics().reports_changed(1))
+    elif instance._rollup_status is not None and instance.status != instance._rollup_status:
+        rollups.record_status_change(instance, instance._rollup_status)
+    instance._rollup_status = instance.__dict__.get('status')
+
+
+@receiver(pre_delete, sender=Report)
+def report_deleting(sender, instance, **kwargs):
+    # The links are gone by post_delete
+    instance._rollup_disease_ids = list(instance.predicted_diseases.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Report)
+def report_deleted(sender, instance, **kwargs):
+    rollups.record_report_deleted(instance, getattr(instance, '_rollup_disease_ids', ()))
+    transaction.on_commit(lambda: get_dashboard_metrics().reports_changed(-1))
+
+
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def patient_changed(sender, instance, created=False, **kwargs):
+    """Keep the daily patient rollup exact, and the cached count once the change commits"""
+    if kwargs.get('raw'):
+        return
+    delta = 1 if created else -1 if kwargs['signal'] is post_delete else 0
+    if created:
+        rollups.record_patients_created(instance.created_at)
+    elif delta:
+        rollups.record_patient_deleted(instance)
+    transaction.on_commit(lambda: get_dashboard_metrics().patients_changed(delta))
+
+
+@receiver(m2m_changed, sender=Report.predicted_diseases.through)
+def predicted_diseases_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep the daily disease counts in step with ``Report.predicted_diseases``"""
+    if action == 'pre_clear':
+        related = instance.reports if reverse else instance.predicted_diseases
+        instance._rollup_cleared = list(related.values_list('pk', flat=True))
+        return
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_rollup_cleared', ())
+        delta = -1
+    elif action in ('post_add', 'post_remove'):
+        delta = 1 if action == 'post_add' else -1
+    else:
+        return
+    if not pk_set:
+        return
+    if reverse:
+        rollups.record_predictions(pk_set, [instance.pk], delta)
+    else:
+        rollups.record_predictions([instance.pk], pk_set, delta)
@@ -12,6 +12,15 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Add form validation
     initializeFormValidation();
+    
+    // Load dashboard widgets
+    initializeDashboard();
+    
+    // Search patients as the user types
+    initializePatientSearch();
+    
+    // Append older reports to a patient's history in place
+    initializeLoadMoreReports();
 });
 
 /**
@@ -30,8 +39,10 @@ function initializeBootstrapComponents() {
         return new bootstrap.Popover(popoverTriggerEl);
     });
     
-    // Add Bootstrap classes to form elements
-    const formControls = document.querySelectorAll('input:not([type="checkbox"]), select, textarea');
+    // Add Bootstrap classes to form elements not already styled as selects or ranges
+    const formControls = document.querySelectorAll(
+        'input:not([type="checkbox"]):not(.form-range), select:not(.form-select), textarea'
+    );
     formControls.forEach(function(element) {
         if (!element.classList.contains('form-control')) {
             element.classList.add('form-control');
@@ -315,6 +326,249 @@ function initializeFormValidation() {
     });
 }
 
+/**
+ * Load every dashboard widget from its own endpoint, in parallel
+ */
+function initializeDashboard() {
+    const dashboard = document.getElementById('dashboard');
+    
+    if (!dashboard) return;
+    
+    loadWidget(dashboard.dataset.countsUrl, renderDashboardCounts);
+    loadWidget(dashboard.dataset.chartUrl, renderHealthTrendsChart);
+    loadWidget(dashboard.dataset.recentReportsUrl, renderRecentReports);
+    loadWidget(dashboard.dataset.commonDiseasesUrl, renderCommonDiseases);
+}
+
+/**
+ * Fetch one widget's JSON and render it; the browser revalidates with the ETag
+ */
+function loadWidget(url, render) {
+    fetch(url, { headers: { 'Accept': 'application/json' } })
+        .then(response => {
+            if (!response.ok) throw new Error(`${url} returned ${response.status}`);
+            return response.json();
+        })
+        .then(render)
+        .catch(error => {
+            console.error('Error loading dashboard widget:', error);
+        });
+}
+
+function renderDashboardCounts(counts) {
+    document.querySelectorAll('[data-count]').forEach(function(element) {
+        const value = counts[element.getAttribute('data-count')];
+        element.textContent = value === undefined ? '-' : value;
+    });
+}
+
+function renderHealthTrendsChart(chart) {
+    const canvas = document.getElementById('healthTrendsChart');
+    
+    if (!canvas || typeof Chart === 'undefined') return;
+    
+    new Chart(canvas.getContext('2d'), {
+        type: 'line',
+        data: {
+            labels: chart.labels,
+            datasets: [{
+                label: 'Health Reports',
+                data: chart.data,
+                backgroundColor: 'rgba(76, 175, 80, 0.2)',
+                borderColor: 'rgba(76, 175, 80, 1)',
+                borderWidth: 2,
+                tension: 0.3
+            }]
+        },
+        options: {
+            responsive: true,
+            scales: {
+                y: {
+                    beginAtZero: true
+                }
+            }
+        }
+    });
+}
+
+function renderRecentReports(reports) {
+    const body = document.getElementById('recent-reports');
+    
+    if (!body) return;
+    
+    if (reports.length === 0) {
+        body.innerHTML = '<tr><td colspan="4" class="text-center">No recent reports available.</td></tr>';
+        return;
+    }
+    
+    body.innerHTML = reports.map(report => `
+        <tr>
+            <td>${escapeHtml(new Date(report.created_at).toLocaleDateString(undefined, { month: 'short', day: '2-digit', year: 'numeric' }))}</td>
+            <td>${escapeHtml(report.patient)}</td>
+            <td>${escapeHtml(report.conditions.join(', '))}</td>
+            <td>
+                <a href="${escapeHtml(report.url)}" class="btn btn-sm btn-primary">
+                    <i class="fas fa-eye"></i> View
+                </a>
+            </td>
+        </tr>
+    `).join('');
+}
+
+function renderCommonDiseases(diseases) {
+    const list = document.getElementById('common-diseases');
+    
+    if (!list) return;
+    
+    if (diseases.length === 0) {
+        list.innerHTML = '<p class="text-center">No common conditions data available.</p>';
+        return;
+    }
+    
+    list.innerHTML = diseases.map(disease => {
+        const description = disease.description.length > 100
+            ? disease.description.slice(0, 99) + '\u2026'
+            : disease.description;
+        return `
+            <div class="list-group-item list-group-item-action">
+                <div class="d-flex w-100 justify-content-between">
+                    <h6 class="mb-1">${escapeHtml(disease.name)}</h6>
+                    <small>${disease.count} cases</small>
+                </div>
+                <p class="mb-1 text-muted small">${escapeHtml(description)}</p>
+            </div>
+        `;
+    }).join('');
+}
+
+/**
+ * Replace the patient table rows with ranked matches from the search endpoint
+ */
+function initializePatientSearch() {
+    const input = document.getElementById('patient-search');
+    const body = document.getElementById('patient-rows');
+    
+    if (!input || !body) return;
+    
+    const originalRows = body.innerHTML;
+    
+    input.addEventListener('input', debounce(function() {
+        const query = input.value.trim();
+        
+        if (query === '') {
+            body.innerHTML = originalRows;
+            return;
+        }
+        
+        fetch(`${input.dataset.searchUrl}?q=${encodeURIComponent(query)}&limit=20`)
+            .then(response => response.json())
+            .then(data => {
+                // Ignore responses for a query the user has since changed
+                if (input.value.trim() === query) renderPatientRows(body, data.results);
+            })
+            .catch(error => {
+                console.error('Error searching patients:', error);
+            });
+    }, 200));
+}
+
+function renderPatientRows(body, patients) {
+    if (patients.length === 0) {
+        body.innerHTML = '<tr><td colspan="6" class="text-center text-muted">No matching patients.</td></tr>';
+        return;
+    }
+    
+    body.innerHTML = patients.map(patient => `
+        <tr>
+            <td><a href="${escapeHtml(patient.url)}" class="text-decoration-none">${escapeHtml(patient.name)}</a></td>
+            <td>${escapeHtml(patient.age)}</td>
+            <td>${escapeHtml(patient.gender)}</td>
+            <td>${escapeHtml(patient.email || patient.phone || 'Not provided')}</td>
+            <td><span class="badge bg-info rounded-pill">${escapeHtml(patient.report_count)}</span></td>
+            <td>
+                <a href="${escapeHtml(patient.url)}" class="btn btn-sm btn-outline-primary">
+                    <i class="fas fa-eye"></i>
+                </a>
+            </td>
+        </tr>
+    `).join('');
+}
+
+/**
+ * Fetch the next page of a patient's reports and append it to the table
+ */
+function initializeLoadMoreReports() {
+    const button = document.getElementById('load-more-reports');
+    const body = document.getElementById('report-rows');
+    
+    if (!button || !body) return;
+    
+    button.addEventListener('click', function(event) {
+        event.preventDefault();
+        button.classList.add('disabled');
+        
+        fetch(`${button.dataset.url}?after=${encodeURIComponent(button.dataset.cursor)}`)
+            .then(response => {
+                if (!response.ok) throw new Error(`${button.dataset.url} returned ${response.status}`);
+                return response.json();
+            })
+            .then(data => {
+                body.insertAdjacentHTML('beforeend', data.results.map(renderReportRow).join(''));
+                if (data.next) {
+                    button.dataset.cursor = data.next;
+                    button.classList.remove('disabled');
+                } else {
+                    button.remove();
+                }
+            })
+            .catch(error => {
+                console.error('Error loading reports:', error);
+                button.classList.remove('disabled');
+            });
+    });
+}
+
+const REPORT_STATUS_BADGES = {
+    DRAFT: 'bg-warning text-dark',
+    COMPLETED: 'bg-success',
+    SHARED: 'bg-primary'
+};
+
+function renderReportRow(report) {
+    return `
+        <tr>
+            <td>${escapeHtml(report.created_at.slice(0, 10))}</td>
+            <td><a href="${escapeHtml(report.url)}" class="text-decoration-none">${escapeHtml(report.title)}</a></td>
+            <td><span class="badge bg-info rounded-pill">${escapeHtml(report.symptom_count)}</span></td>
+            <td><span class="badge bg-secondary rounded-pill">${escapeHtml(report.disease_count)}</span></td>
+            <td><span class="badge ${REPORT_STATUS_BADGES[report.status] || 'bg-secondary'}">${escapeHtml(report.status_display)}</span></td>
+            <td>
+                <div class="btn-group btn-group-sm">
+                    <a href="${escapeHtml(report.url)}" class="btn btn-outline-primary"><i class="fas fa-eye"></i></a>
+                    <a href="${escapeHtml(report.update_url)}" class="btn btn-outline-secondary"><i class="fas fa-edit"></i></a>
+                    <a href="${escapeHtml(report.share_url)}" class="btn btn-outline-info"><i class="fas fa-share-alt"></i></a>
+                    <a href="${escapeHtml(report.pdf_url)}" class="btn btn-outline-danger"><i class="fas fa-file-pdf"></i></a>
+                </div>
+            </td>
+        </tr>
+    `;
+}
+
+const HTML_ESCAPES = {
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+    "'": '&#39;'
+};
+
+/**
+ * Escape text for insertion into HTML, including quoted attribute values
+ */
+function escapeHtml(text) {
+    return String(text ?? '').replace(/[&<>"']/g, char => HTML_ESCAPES[char]);
+}
+
 /**
  * Debounce function to limit how often a function is called
  */
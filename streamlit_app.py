@@ -2,11 +2,19 @@ import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import datetime
-import random
 import uuid
 from PIL import Image
 import io
 
+from prediction import RemedyIndex, SymptomIndex
+
+# Number of conditions shown for an assessment
+PREDICTION_TOP_K = 5
+
+# Rows rendered per page of the patient list and of a patient's reports
+PATIENTS_PER_PAGE = 20
+REPORTS_PER_PAGE = 10
+
 # Set page configuration
 st.set_page_config(
     page_title="Health Predictor",
@@ -115,95 +123,198 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Helper functions
+def get_id_index(collection):
+    """Return an {id: item} dict for a session_state list
+    
+    The dict is kept in st.session_state next to the list and rebuilt only
+    when the list is replaced or changes size outside add_item.
+    """
+    items = st.session_state[collection]
+    key = f"_{collection}_by_id"
+    cached = st.session_state.get(key)
+    if cached is None or cached[0] is not items or len(cached[1]) != len(items):
+        cached = (items, {item["id"]: item for item in items})
+        st.session_state[key] = cached
+    return cached[1]
+
+def get_reports_by_patient():
+    """Return a {patient_id: [report, ...]} dict grouping st.session_state.reports
+    
+    Like get_id_index, it is kept in st.session_state, extended by add_item
+    and rebuilt only when the reports list is replaced or changes size
+    outside add_item.
+    """
+    reports = st.session_state.reports
+    cached = st.session_state.get("_reports_by_patient")
+    if cached is None or cached["items"] is not reports or cached["size"] != len(reports):
+        groups = {}
+        for report in reports:
+            groups.setdefault(report["patient_id"], []).append(report)
+        cached = {"items": reports, "size": len(reports), "groups": groups}
+        st.session_state["_reports_by_patient"] = cached
+    return cached["groups"]
+
+def add_item(collection, item):
+    """Append item to a session_state list and its id index"""
+    index = get_id_index(collection)
+    groups = get_reports_by_patient() if collection == "reports" else None
+    st.session_state[collection].append(item)
+    index[item["id"]] = item
+    if groups is not None:
+        groups.setdefault(item["patient_id"], []).append(item)
+        st.session_state["_reports_by_patient"]["size"] += 1
+    versions = st.session_state.setdefault("_data_versions", {})
+    versions[collection] = versions.get(collection, 0) + 1
+
 def get_symptom_by_id(symptom_id):
-    for symptom in st.session_state.symptoms:
-        if symptom["id"] == symptom_id:
-            return symptom
-    return None
+    return get_id_index("symptoms").get(symptom_id)
 
 def get_disease_by_id(disease_id):
-    for disease in st.session_state.diseases:
-        if disease["id"] == disease_id:
-            return disease
-    return None
+    return get_id_index("diseases").get(disease_id)
 
 def get_remedy_by_id(remedy_id):
-    for remedy in st.session_state.remedies:
-        if remedy["id"] == remedy_id:
-            return remedy
-    return None
+    return get_id_index("remedies").get(remedy_id)
 
 def get_patient_by_id(patient_id):
-    for patient in st.session_state.patients:
-        if patient["id"] == patient_id:
-            return patient
-    return None
+    return get_id_index("patients").get(patient_id)
 
 def get_report_by_id(report_id):
-    for report in st.session_state.reports:
-        if report["id"] == report_id:
-            return report
-    return None
+    return get_id_index("reports").get(report_id)
+
+def paginate(items, per_page, key):
+    """Show a page picker when items span several pages and return the current page's items"""
+    pages = max(1, -(-len(items) // per_page))
+    if pages == 1:
+        return items
+    # The page count is part of the key so a shrinking list starts again at page 1
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1, key=f"{key}_{pages}")
+    start = (page - 1) * per_page
+    return items[start:start + per_page]
 
-def predict_diseases(symptom_ids):
-    """Predict diseases based on symptoms"""
+def get_symptom_index():
+    """Return the symptom index for the disease catalog, building it once per session"""
+    if "_symptom_index" not in st.session_state:
+        st.session_state._symptom_index = SymptomIndex(
+            ((disease["id"], disease["symptoms"], disease["severity_level"])
+             for disease in st.session_state.diseases),
+            symptom_levels={symptom["id"]: symptom["severity_level"] for symptom in st.session_state.symptoms},
+        )
+    return st.session_state._symptom_index
+
+def predict_diseases(symptom_ids, mode="match", symptom_data=None, limit=PREDICTION_TOP_K):
+    """Predict diseases based on symptoms
+    
+    mode is "match" to rank by the percentage of each disease's symptoms that
+    were selected, or "weighted" to also weigh the severity and duration in
+    symptom_data.
+    """
     if not symptom_ids:
         return []
     
-    disease_scores = []
-    for disease in st.session_state.diseases:
-        common_symptoms = set(disease["symptoms"]).intersection(set(symptom_ids))
-        if common_symptoms:
-            score = len(common_symptoms) / len(disease["symptoms"]) * 100
-            disease_scores.append((disease, score))
-    
-    # Sort by score (descending)
-    disease_scores.sort(key=lambda x: x[1], reverse=True)
-    return disease_scores[:5]  # Return top 5 diseases
+    if mode == "weighted":
+        symptom_data = symptom_data or {}
+        query = {symptom_id: symptom_data.get(symptom_id, {}) for symptom_id in symptom_ids}
+    else:
+        query = symptom_ids
+    ranking = get_symptom_index().rank(query, limit=limit, mode=mode)
+    return [(get_disease_by_id(disease_id), score) for disease_id, score in ranking]
+
+def get_remedy_index():
+    """Return the inverted remedy index, building it once per session"""
+    if "_remedy_index" not in st.session_state:
+        st.session_state._remedy_index = RemedyIndex(
+            (remedy["id"], remedy["effectiveness_rating"], remedy["diseases"], remedy["symptoms"])
+            for remedy in st.session_state.remedies
+        )
+    return st.session_state._remedy_index
 
 def recommend_remedies(disease_ids, symptom_ids):
     """Recommend remedies based on diseases and symptoms"""
     if not disease_ids and not symptom_ids:
         return []
     
-    recommended_remedies = []
-    for remedy in st.session_state.remedies:
-        # Check if remedy is for any of the diseases or symptoms
-        if (set(remedy["diseases"]).intersection(set(disease_ids)) or 
-            set(remedy["symptoms"]).intersection(set(symptom_ids))):
-            recommended_remedies.append(remedy)
-    
-    # Sort by effectiveness rating (descending)
-    recommended_remedies.sort(key=lambda x: x["effectiveness_rating"], reverse=True)
-    return recommended_remedies
+    # Posting lists are pre-sorted by effectiveness rating (descending)
+    remedy_ids = get_remedy_index().recommend(disease_ids, symptom_ids)
+    return [get_remedy_by_id(remedy_id) for remedy_id in remedy_ids]
 
-def generate_chart_data():
-    """Generate random data for charts"""
-    dates = [(datetime.datetime.now() - datetime.timedelta(days=i)).strftime('%Y-%m-%d') for i in range(6, -1, -1)]
-    symptom_counts = [random.randint(5, 20) for _ in range(7)]
-    disease_counts = [random.randint(3, 15) for _ in range(7)]
-    
-    return dates, symptom_counts, disease_counts
+CHART_DAYS = 7
 
-def create_chart():
-    """Create a chart for the dashboard"""
-    dates, symptom_counts, disease_counts = generate_chart_data()
+def get_data_version(collection):
+    """Return a number that changes whenever add_item appends to collection"""
+    return st.session_state.get("_data_versions", {}).get(collection, 0), len(st.session_state[collection])
+
+def aggregate_reports(reports, days=CHART_DAYS, today=None):
+    """Aggregate reports with a vectorized pandas groupby
+    
+    Returns (daily, disease_counts): daily is indexed by the last `days`
+    dates with the number of symptoms and predicted conditions reported on
+    each; disease_counts maps disease ids to the number of reports that
+    predicted them, most common first.
+    """
+    today = pd.Timestamp(today or datetime.date.today()).normalize()
+    dates = pd.date_range(end=today, periods=days, freq="D")
+    
+    if not reports:
+        daily = pd.DataFrame({"symptoms": 0, "conditions": 0}, index=dates)
+        return daily, pd.Series(dtype="int64")
+    
+    df = pd.DataFrame({
+        "date": pd.to_datetime([report["created_at"] for report in reports]).normalize(),
+        "symptoms": [len(report["symptoms"]) for report in reports],
+        "predicted_diseases": [report["predicted_diseases"] for report in reports],
+    })
+    df["conditions"] = df["predicted_diseases"].str.len()
+    
+    daily = (
+        df[df["date"] >= dates[0]]
+        .groupby("date")[["symptoms", "conditions"]]
+        .sum()
+        .reindex(dates, fill_value=0)
+    )
+    disease_counts = df["predicted_diseases"].explode().dropna().value_counts()
+    return daily, disease_counts
+
+def get_report_aggregates():
+    """Return aggregate_reports() for the session's reports, cached per data version"""
+    version = (get_data_version("reports"), datetime.date.today())
+    cached = st.session_state.get("_report_aggregates")
+    if cached is None or cached[0] != version:
+        cached = (version, aggregate_reports(st.session_state.reports))
+        st.session_state._report_aggregates = cached
+    return cached[1]
+
+def render_chart(daily):
+    """Render the health trends chart to PNG bytes"""
+    dates = daily.index.strftime('%Y-%m-%d')
     
     fig, ax = plt.subplots(figsize=(10, 5))
-    ax.plot(dates, symptom_counts, marker='o', linewidth=2, label='Symptoms')
-    ax.plot(dates, disease_counts, marker='s', linewidth=2, label='Conditions')
+    ax.plot(dates, daily["symptoms"], marker='o', linewidth=2, label='Symptoms')
+    ax.plot(dates, daily["conditions"], marker='s', linewidth=2, label='Conditions')
     
     ax.set_xlabel('Date')
     ax.set_ylabel('Count')
-    ax.set_title('Health Trends - Last 7 Days')
+    ax.set_title(f'Health Trends - Last {len(daily)} Days')
     ax.grid(True, linestyle='--', alpha=0.7)
     ax.legend()
     
     # Rotate date labels for better readability
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+    plt.setp(ax.get_xticklabels(), rotation=45)
+    fig.tight_layout()
     
-    return fig
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    plt.close(fig)
+    return buffer.getvalue()
+
+def create_chart():
+    """Return the dashboard chart as PNG bytes, re-rendering only when reports change"""
+    version = (get_data_version("reports"), datetime.date.today())
+    cached = st.session_state.get("_chart_png")
+    if cached is None or cached[0] != version:
+        daily, _ = get_report_aggregates()
+        cached = (version, render_chart(daily))
+        st.session_state._chart_png = cached
+    return cached[1]
 
 # Navigation
 def navigation():
@@ -406,7 +517,18 @@ def show_prediction_results():
         st.table(pd.DataFrame(symptom_data))
     
     # Predict diseases
-    disease_predictions = predict_diseases(st.session_state.selected_symptoms)
+    ranking_method = st.radio(
+        "Rank conditions by",
+        ["Symptom match", "Severity weighted"],
+        horizontal=True,
+        key="ranking_method"
+    )
+    scoring_mode = "weighted" if ranking_method == "Severity weighted" else "match"
+    disease_predictions = predict_diseases(
+        st.session_state.selected_symptoms,
+        mode=scoring_mode,
+        symptom_data=st.session_state.symptom_data
+    )
     
     # Display predicted diseases
     st.markdown("### Potential Health Conditions")
@@ -418,7 +540,10 @@ def show_prediction_results():
             col1, col2 = st.columns([3, 1])
             
             with col1:
-                st.markdown(f"**{disease['name']}** (Match: {score:.1f}%)")
+                if scoring_mode == "weighted":
+                    st.markdown(f"**{disease['name']}** (Score: {score:.2f})")
+                else:
+                    st.markdown(f"**{disease['name']}** (Match: {score:.1f}%)")
                 st.markdown(disease["description"])
             
             with col2:
@@ -466,7 +591,7 @@ def show_prediction_results():
                     "status": "COMPLETED"
                 }
                 
-                st.session_state.reports.append(new_report)
+                add_item("reports", new_report)
                 st.success("Report saved successfully!")
     else:
         st.info("No health conditions could be predicted based on the provided symptoms.")
@@ -507,8 +632,7 @@ def dashboard_page():
     # Health trends chart
     st.markdown('<h2 class="sub-header">Health Trends</h2>', unsafe_allow_html=True)
     
-    chart = create_chart()
-    st.pyplot(chart)
+    st.image(create_chart(), use_container_width=True)
     
     # Recent reports and common conditions
     col1, col2 = st.columns(2)
@@ -531,17 +655,9 @@ def dashboard_page():
     with col2:
         st.markdown('<h2 class="sub-header">Common Conditions</h2>', unsafe_allow_html=True)
         
-        # Count diseases in reports
-        disease_counts = {}
-        for report in st.session_state.reports:
-            for disease_id in report["predicted_diseases"]:
-                if disease_id in disease_counts:
-                    disease_counts[disease_id] += 1
-                else:
-                    disease_counts[disease_id] = 1
-        
-        # Sort by count
-        sorted_diseases = sorted(disease_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+        # Count diseases in reports (cached with the chart aggregates)
+        _, disease_counts = get_report_aggregates()
+        sorted_diseases = list(disease_counts.head(5).items())
         
         if sorted_diseases:
             for disease_id, count in sorted_diseases:
@@ -581,8 +697,10 @@ def patients_page():
             if search_query:
                 filtered_patients = [p for p in st.session_state.patients if search_query.lower() in p["name"].lower()]
             
-            # Display patients
-            for patient in filtered_patients:
+            reports_by_patient = get_reports_by_patient()
+            
+            # Display one page of patients
+            for patient in paginate(filtered_patients, PATIENTS_PER_PAGE, "patient_list_page"):
                 col1, col2, col3 = st.columns([3, 1, 1])
                 
                 with col1:
@@ -591,9 +709,7 @@ def patients_page():
                         st.markdown(f"Email: {patient['email']} | Phone: {patient.get('phone', 'N/A')}")
                 
                 with col2:
-                    # Count reports for this patient
-                    patient_reports = [r for r in st.session_state.reports if r["patient_id"] == patient["id"]]
-                    st.markdown(f"Reports: {len(patient_reports)}")
+                    st.markdown(f"Reports: {len(reports_by_patient.get(patient['id'], ()))}")
                 
                 with col3:
                     if st.button("View Details", key=f"view_{patient['id']}"):
@@ -647,10 +763,11 @@ def patients_page():
             # Display patient reports
             st.markdown("### Patient Reports")
             
-            patient_reports = [r for r in st.session_state.reports if r["patient_id"] == patient["id"]]
+            patient_reports = get_reports_by_patient().get(patient["id"], [])
             
             if patient_reports:
-                for report in sorted(patient_reports, key=lambda x: x["created_at"], reverse=True):
+                patient_reports = sorted(patient_reports, key=lambda x: x["created_at"], reverse=True)
+                for report in paginate(patient_reports, REPORTS_PER_PAGE, f"patient_reports_page_{patient['id']}"):
                     col1, col2 = st.columns([3, 1])
                     
                     with col1:
@@ -777,7 +894,7 @@ def add_patient_form(container):
                         "created_at": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                     }
                     
-                    st.session_state.patients.append(new_patient)
+                    add_item("patients", new_patient)
                     st.success(f"Patient {name} added successfully!")
                     
                     # Clear form by triggering a rerun
@@ -1,3 +1,916 @@
-from django.test import TestCase
+import csv
+import datetime
+import importlib
+import importlib.util
+import io
+import json
+import os
+import tempfile
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import Count, Q
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import views
+from .catalog import (
+    bump_catalog_version, get_snapshot, invalidate_snapshot, predict, predict_diseases, refresh_snapshot,
+)
+from .dashboard import DashboardMetrics, get_dashboard_metrics, patient_total, report_series, top_diseases
+from .models import DailyDiseaseStat, DailyPatientStat, DailyReportStat, Disease, Patient, Remedy, Report, Symptom
+from .patient_import import PatientValidator, import_patients, read_rows
+from .patient_search import search_patient_ids
+from .prediction import RemedyIndex, SymptomIndex
+from .report_export import BULK_HEADER, bulk_rows, filter_reports
+from .report_pdf import ReportPDFCache
+from .report_queue import ReportQueue
+from .report_writer import ReportDraft, write_report, write_reports
+from .result_cache import get_prediction_cache
+from .rollups import rebuild
+
+
+class SymptomIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = SymptomIndex([
+            (1, [2, 5, 9], 2),
+            (2, [1, 2, 3, 4, 9], 4),
+            (3, [1, 2, 4, 6, 10], 5),
+            (4, [1, 7, 8], 3),
+            (5, [3, 7], 3),
+        ])
+
+    def test_rank_by_count_orders_by_matches_then_severity(self):
+        self.assertEqual(
+            self.index.rank_by_count([1, 2, 4]),
+            [(3, 3), (2, 3), (4, 1), (1, 1)],
+        )
+
+    def test_rank_by_match_orders_by_percentage(self):
+        ranking = self.index.rank_by_match([3, 7])
+        self.assertEqual([disease_id for disease_id, _ in ranking], [5, 4, 2])
+        self.assertEqual(ranking[0][1], 100.0)
+
+    def test_ties_go_to_higher_severity(self):
+        index = SymptomIndex([(1, [1, 2], 2), (2, [1, 3], 6), (3, [1, 4], 4)])
+        self.assertEqual([d for d, _ in index.rank_by_match([1], limit=2)], [2, 3])
+
+    def test_unknown_symptoms_match_nothing(self):
+        self.assertEqual(self.index.rank_by_count([42]), [])
+
+    @skipUnless(importlib.util.find_spec('scipy'), "SciPy is not installed")
+    def test_rank_batch_matches_single_rankings(self):
+        symptom_sets = [[1, 2, 4], [3, 7], [42], [], [9, 2, 1, 6]]
+        self.assertEqual(
+            self.index.rank_batch(symptom_sets, limit=3),
+            [self.index.rank_by_count(s, limit=3) for s in symptom_sets],
+        )
+        self.assertEqual(
+            self.index.rank_batch(symptom_sets, mode='match'),
+            [self.index.rank_by_match(s) for s in symptom_sets],
+        )
+
+    @skipUnless(importlib.util.find_spec('scipy'), "SciPy is not installed")
+    def test_weighted_rank_uses_severity_and_duration(self):
+        mild = {6: {'severity': 2, 'duration': 'hours'}, 7: {'severity': 9, 'duration': 'weeks'}}
+        severe = {6: {'severity': 9, 'duration': 'weeks'}, 7: {'severity': 2, 'duration': 'hours'}}
+
+        self.assertEqual(self.index.rank_weighted(mild)[0][0], 4)
+        self.assertEqual(self.index.rank_weighted(severe)[0][0], 3)
+        self.assertEqual(
+            self.index.rank_batch([mild, severe], mode='weighted'),
+            [self.index.rank_weighted(mild), self.index.rank_weighted(severe)],
+        )
+
+
+class RemedyIndexTests(SimpleTestCase):
+    def test_recommend_merges_postings_by_effectiveness(self):
+        index = RemedyIndex([
+            (1, 4, [1, 2, 3], [1, 4]),
+            (2, 3, [4], [7]),
+            (3, 3, [1], [2, 5]),
+            (5, 4, [4], [8]),
+        ])
+        self.assertEqual(index.recommend([4], [2, 7]), [5, 2, 3])
+        self.assertEqual(index.recommend([1], [1, 2], limit=1), [1])
+        self.assertEqual(index.recommend([], [9]), [])
+
+
+class PredictDiseasesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.symptoms = [
+            Symptom.objects.create(name=f'Symptom {i}', description='') for i in range(6)
+        ]
+        for i, (severity, symptom_slice) in enumerate([(2, slice(0, 2)), (5, slice(0, 3)),
+                                                        (3, slice(2, 5)), (7, slice(4, 6))]):
+            disease = Disease.objects.create(name=f'Disease {i}', description='', severity_level=severity)
+            disease.symptoms.set(cls.symptoms[symptom_slice])
+
+    def test_matches_orm_ranking(self):
+        selected = [self.symptoms[0].id, self.symptoms[2].id, self.symptoms[4].id]
+        expected = Disease.objects.filter(symptoms__in=selected).annotate(
+            symptom_count=Count('symptoms', filter=Q(symptoms__in=selected))
+        ).order_by('-symptom_count', '-severity_level')[:5]
+
+        predicted = predict_diseases(selected)
+
+        self.assertEqual(
+            [(d.id, score) for d, score in predicted],
+            [(d.id, d.symptom_count) for d in expected],
+        )
+
+    def test_index_is_rebuilt_after_catalog_change(self):
+        predict_diseases([self.symptoms[5].id])
+        disease = Disease.objects.get(name='Disease 0')
+        disease.symptoms.add(self.symptoms[5])
+
+        predicted = predict_diseases([self.symptoms[5].id])
+
+        self.assertIn(disease.id, [d.id for d, _ in predicted])
+
+
+class CatalogSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fever = Symptom.objects.create(name='Fever', description='High temperature', body_part=None)
+        cls.cough = Symptom.objects.create(name='Cough', description='Dry or wet', body_part='Chest')
+        cls.flu = Disease.objects.create(name='Influenza', description='')
+        cls.flu.symptoms.set([cls.fever, cls.cough])
+
+    @override_settings(CATALOG_SNAPSHOT={'CHECK_INTERVAL': 60})
+    def test_snapshot_is_reused_until_the_catalog_changes(self):
+        snapshot = get_snapshot()
+        with self.assertNumQueries(0):
+            self.assertIs(get_snapshot(), snapshot)
+            snapshot.search_symptoms('temp')
+
+        Symptom.objects.create(name='Sneezing', description='', body_part='Nose')
+        fresh = get_snapshot()
+
+        self.assertGreater(fresh.version, snapshot.version)
+        self.assertEqual(fresh.body_parts, ('Chest', 'Nose'))
+        # Readers holding the old snapshot keep a consistent view
+        self.assertEqual(snapshot.body_parts, ('Chest',))
+
+    @override_settings(CATALOG_SNAPSHOT={'CHECK_INTERVAL': 0})
+    def test_changes_made_by_another_process_retire_the_snapshot(self):
+        snapshot = get_snapshot()
+        # The rollback at the end of the test does not retire the snapshot
+        self.addCleanup(invalidate_snapshot)
+        # Another process edits the catalog: no signal runs here, only the shared version moves
+        Symptom.objects.filter(pk=self.cough.pk).update(body_part='Throat')
+        self.assertIs(get_snapshot(), snapshot)
+        bump_catalog_version()
+
+        self.assertEqual(get_snapshot().body_parts, ('Throat',))
+
+    def test_records_carry_their_links(self):
+        snapshot = get_snapshot()
+        self.assertEqual(
+            [symptom.name for symptom in snapshot.diseases[self.flu.id].symptoms],
+            ['Fever', 'Cough'],
+        )
+        self.assertEqual([s.name for s in snapshot.search_symptoms('TEMP')], ['Fever'])
+        self.assertEqual([s.name for s in snapshot.search_symptoms(body_part='Chest')], ['Cough'])
+
+
+class PredictionCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fever = Symptom.objects.create(name='Fever', description='')
+        cls.cough = Symptom.objects.create(name='Cough', description='')
+        cls.flu = Disease.objects.create(name='Influenza', description='')
+        cls.flu.symptoms.set([cls.fever, cls.cough])
+        cls.tea = Remedy.objects.create(name='Ginger Tea', remedy_type='NATURAL', description='', instructions='')
+        cls.tea.diseases.add(cls.flu)
+
+    def setUp(self):
+        self.cache = get_prediction_cache()
+        self.cache.invalidate()
+
+    def test_same_symptom_set_is_served_from_cache(self):
+        before = self.cache.stats()
+        first = predict([self.fever.id, self.cough.id])
+        second = predict([self.cough.id, self.fever.id, self.cough.id])
+        after = self.cache.stats()
+
+        self.assertEqual(first, second)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+    def test_remedy_link_change_invalidates_cached_results(self):
+        predict([self.cough.id])
+        syrup = Remedy.objects.create(name='Honey Syrup', remedy_type='NATURAL', description='', instructions='')
+        syrup.symptoms.add(self.cough)
+
+        _, remedy_ids = predict([self.cough.id])
+
+        self.assertEqual(set(remedy_ids), {self.tea.id, syrup.id})
+
+    def test_results_from_a_stale_snapshot_are_not_served_to_a_fresh_one(self):
+        stale = refresh_snapshot()
+        syrup = Remedy.objects.create(name='Honey Syrup', remedy_type='NATURAL', description='', instructions='')
+        syrup.symptoms.add(self.cough)
+        # A request that took its snapshot before the edit finishes afterwards
+        self.assertEqual(stale.predict([self.cough.id])[1], [self.tea.id])
+
+        _, remedy_ids = predict([self.cough.id])
+
+        self.assertEqual(set(remedy_ids), {self.tea.id, syrup.id})
+
+
+class ReportWriterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(name='Asha', age=34, gender='F')
+        cls.symptoms = [Symptom.objects.create(name=f'Symptom {i}', description='') for i in range(3)]
+        cls.disease = Disease.objects.create(name='Influenza', description='')
+        cls.remedy = Remedy.objects.create(name='Rest', remedy_type='LIFESTYLE', description='', instructions='')
+        # Today's rollup rows already exist in steady state
+        write_report(cls.patient.id, 'Earlier report', disease_ids=[cls.disease.id])
+
+    def test_report_and_links_are_written_in_one_insert_per_table(self):
+        symptom_ids = [s.id for s in self.symptoms]
+        with self.assertNumQueries(8):  # savepoint, four inserts, two rollup updates, release
+            report = write_report(self.patient.id, 'Report', symptom_ids + symptom_ids[:1],
+                                  [self.disease.id], [self.remedy.id])
+
+        report = Report.objects.get(pk=report.pk)
+        self.assertEqual(sorted(report.symptoms.values_list('id', flat=True)), symptom_ids)
+        self.assertEqual(list(report.predicted_diseases.all()), [self.disease])
+        self.assertEqual(list(report.recommended_remedies.all()), [self.remedy])
+
+    def test_bulk_variant_keeps_input_order(self):
+        drafts = [
+            ReportDraft(self.patient.id, f'Report {i}', symptom_ids=[self.symptoms[i].id])
+            for i in range(3)
+        ]
+        with self.assertNumQueries(5):  # no inserts for empty link tables
+            reports = write_reports(drafts)
+
+        self.assertEqual(
+            [list(r.symptoms.values_list('id', flat=True)) for r in reports],
+            [[s.id] for s in self.symptoms],
+        )
+
+
+class ReportQueueTests(TransactionTestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(name='Asha', age=34, gender='F')
+        self.symptom = Symptom.objects.create(name='Fever', description='')
+
+    def test_queued_reports_are_written_in_batches(self):
+        report_queue = ReportQueue(batch_size=10, flush_interval=0.05)
+        for i in range(25):
+            report_queue.put(ReportDraft(self.patient.id, f'Report {i}', symptom_ids=[self.symptom.id]))
+        report_queue.flush()
+
+        self.assertEqual(report_queue.depth(), 0)
+        self.assertEqual(Report.objects.count(), 25)
+        self.assertEqual(Report.symptoms.through.objects.count(), 25)
+        report_queue.close()
+
+    def test_close_writes_everything_and_skips_bad_drafts(self):
+        report_queue = ReportQueue(flush_interval=60)
+        with self.assertLogs('health_predictor.report_queue', 'ERROR'):
+            report_queue.put(ReportDraft(self.patient.id, 'Kept'))
+            report_queue.put(ReportDraft(self.patient.id + 1, 'Unknown patient'))
+            report_queue.close()
+
+        self.assertEqual(list(Report.objects.values_list('title', flat=True)), ['Kept'])
+        self.assertEqual(report_queue.stats()['failed'], 1)
+        self.assertEqual(report_queue.failed_drafts, [ReportDraft(self.patient.id + 1, 'Unknown patient')])
+
+    def test_transient_failures_are_retried(self):
+        report_queue = ReportQueue(flush_interval=60, retries=2, retry_delay=0)
+        failures = iter([DatabaseError('database is locked')])
+
+        def flaky_write(drafts, **kwargs):
+            for error in failures:
+                raise error
+            return write_reports(drafts, **kwargs)
+
+        with mock.patch('health_predictor.report_queue.write_reports', flaky_write):
+            report_queue.put(ReportDraft(self.patient.id, 'Retried'))
+            report_queue.close()
+
+        self.assertEqual(list(Report.objects.values_list('title', flat=True)), ['Retried'])
+        self.assertEqual(report_queue.stats()['failed'], 0)
+
+    def test_stats_without_write_behind_do_not_create_the_queue(self):
+        with mock.patch('health_predictor.report_queue.get_report_queue') as get_queue:
+            response = self.client.get(reverse('health_predictor:api_report_queue'))
+        get_queue.assert_not_called()
+        self.assertEqual(response.json()['depth'], 0)
+        self.assertFalse(response.json()['running'])
+
+
+class AssessmentReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(name='Asha', age=34, gender='F')
+        cls.fever = Symptom.objects.create(name='Fever', description='')
+        cls.flu = Disease.objects.create(name='Influenza', description='')
+        cls.flu.symptoms.add(cls.fever)
+
+    def assess(self):
+        self.client.post(reverse('health_predictor:symptom_checker', args=[self.patient.id]),
+                         {f'symptom_{self.fever.id}': 'on'})
+        self.client.post(reverse('health_predictor:symptom_severity', args=[self.patient.id]),
+                         {f'severity_{self.fever.id}': 5, f'duration_{self.fever.id}': 'days'})
+
+    def view_results(self):
+        # The results template needs filters this app does not ship, so only
+        # the view's side effects are checked here.
+        with mock.patch.object(views, 'render', return_value=HttpResponse()):
+            self.client.get(reverse('health_predictor:prediction_results', args=[self.patient.id]))
+
+    def test_refreshing_results_reuses_the_report(self):
+        self.assess()
+        self.view_results()
+        self.view_results()
+        self.assertEqual(self.patient.reports.count(), 1)
+
+        self.assess()
+        self.view_results()
+        self.assertEqual(self.patient.reports.count(), 2)
+
+    def test_dedupe_command_keeps_one_report_per_assessment(self):
+        drafts = [ReportDraft(self.patient.id, 'Health Report', [self.fever.id], [self.flu.id])] * 3
+        drafts.append(ReportDraft(self.patient.id, 'Health Report', [self.fever.id]))
+        kept = write_reports(drafts)[0]
+
+        call_command('dedupe_reports', chunk_size=1, stdout=io.StringIO())
+
+        self.assertEqual(self.patient.reports.count(), 2)
+        self.assertTrue(self.patient.reports.filter(pk=kept.pk).exists())
+
+    def test_dedupe_command_keeps_identical_drafts_from_separate_assessments(self):
+        drafts = write_reports([ReportDraft(self.patient.id, 'Health Report', [self.fever.id], [self.flu.id])] * 3)
+        # The third draft repeats the same answers two hours later
+        Report.objects.filter(pk=drafts[2].pk).update(created_at=drafts[0].created_at + datetime.timedelta(hours=2))
+
+        call_command('dedupe_reports', window=30, stdout=io.StringIO())
+
+        self.assertCountEqual(self.patient.reports.values_list('pk', flat=True), [drafts[0].pk, drafts[2].pk])
+
+    def test_switching_scoring_mode_saves_another_report(self):
+        self.assess()
+        self.view_results()
+        with mock.patch.object(views, 'render', return_value=HttpResponse()):
+            url = reverse('health_predictor:prediction_results', args=[self.patient.id])
+            self.client.get(url, {'mode': 'weighted'})
+            self.client.get(url, {'mode': 'weighted'})
+            self.client.get(url, {'mode': 'count'})
+        self.assertEqual(self.patient.reports.count(), 2)
+
+
+class ReportSeriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        patient = Patient.objects.create(name='Asha', age=34, gender='F')
+        now = timezone.now()
+        for days_ago in (0, 0, 1, 9, 40):
+            report = Report.objects.create(patient=patient, title='Report')
+            Report.objects.filter(pk=report.pk).update(created_at=now - datetime.timedelta(days=days_ago))
+        call_command('rebuild_rollups', chunk_size=2, stdout=io.StringIO())
+
+    def test_daily_series_fills_empty_days(self):
+        with self.assertNumQueries(1):
+            labels, counts = report_series(7, 'day')
+        self.assertEqual(len(labels), 7)
+        self.assertEqual(counts, [0, 0, 0, 0, 0, 1, 2])
+
+    def test_coarser_buckets_cover_the_whole_range(self):
+        _, weekly = report_series(30, 'week')
+        _, monthly = report_series(90, 'month')
+        self.assertEqual(sum(weekly), 4)
+        self.assertEqual(sum(monthly), 5)
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(name='Asha', age=34, gender='F')
+        cls.flu = Disease.objects.create(name='Influenza', description='')
+        cls.cold = Disease.objects.create(name='Common Cold', description='')
+
+    def rollup(self):
+        return (
+            sorted(DailyReportStat.objects.filter(count__gt=0).values_list('date', 'status', 'count')),
+            sorted(DailyDiseaseStat.objects.filter(count__gt=0).values_list('date', 'disease_id', 'count')),
+            sorted(DailyPatientStat.objects.filter(count__gt=0).values_list('date', 'count')),
+        )
+
+    def test_incremental_updates_match_a_rebuild(self):
+        first = Report.objects.create(patient=self.patient, title='First')
+        first.predicted_diseases.add(self.flu, self.cold)
+        first.predicted_diseases.remove(self.cold)
+        second = write_report(self.patient.id, 'Second', disease_ids=[self.flu.id, self.cold.id])
+        second.status = 'SHARED'
+        second.save()
+        self.cold.reports.clear()
+        Report.objects.create(patient=self.patient, title='Third').delete()
+        Patient.objects.create(name='Ravi', age=51, gender='M')
+        Patient.objects.create(name='Mei', age=29, gender='F').delete()
+
+        incremental = self.rollup()
+        rebuild()
+        self.assertEqual(incremental, self.rollup())
+        self.assertEqual(patient_total(), 2)
+        self.assertEqual(top_diseases(), [dict(get_snapshot().diseases[self.flu.id]._asdict(), count=2)])
+
+    def test_status_change_on_a_report_loaded_without_status_is_counted(self):
+        report = write_report(self.patient.id, 'Report')
+        report = Report.objects.only('title', 'created_at').get(pk=report.pk)
+        report.status = 'COMPLETED'
+        report.save()
+
+        incremental = self.rollup()
+        self.assertEqual([status for _, status, _ in incremental[0]], ['COMPLETED'])
+        rebuild()
+        self.assertEqual(incremental, self.rollup())
+
+    def test_migration_backfills_empty_rollups(self):
+        backfill = importlib.import_module(f'{__package__}.migrations.0007_backfill_rollups').backfill_rollups
+        write_report(self.patient.id, 'First', disease_ids=[self.flu.id, self.cold.id])
+        write_report(self.patient.id, 'Second', disease_ids=[self.flu.id])
+        expected = self.rollup()
+        DailyReportStat.objects.all().delete()
+        DailyDiseaseStat.objects.all().delete()
+
+        backfill(apps, mock.Mock(connection=connection))
+        self.assertEqual(self.rollup(), expected)
+        # Rows that already exist are left alone
+        backfill(apps, mock.Mock(connection=connection))
+        self.assertEqual(self.rollup(), expected)
+
+
+class DashboardMetricsTests(TestCase):
+    def setUp(self):
+        self.metrics = get_dashboard_metrics()
+        self.metrics.clear()
+        # The test cache is local memory; treat it as shared, as a single-process site may
+        patcher = mock.patch.object(self.metrics, 'shared', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(CATALOG_SNAPSHOT={'CHECK_INTERVAL': 60})
+    def test_counts_are_cached_and_kept_exact(self):
+        patient = Patient.objects.create(name='Asha', age=34, gender='F')
+        self.assertEqual(self.metrics.counts()['patient_count'], 1)
+        with self.assertNumQueries(0):
+            self.metrics.counts()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Patient.objects.create(name='Ravi', age=51, gender='M')
+            report = Report.objects.create(patient=patient, title='Report')
+            write_reports([ReportDraft(patient.id, 'Bulk')] * 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            report.delete()
+
+        with self.assertNumQueries(0):
+            counts = self.metrics.counts()
+        self.assertEqual((counts['patient_count'], counts['report_count']), (2, 2))
+        self.assertEqual(
+            (counts['patient_count'], counts['report_count']),
+            (Patient.objects.count(), Report.objects.count()),
+        )
+
+    def test_process_local_cache_recounts(self):
+        metrics = DashboardMetrics(caches['default'])
+        self.assertFalse(metrics.shared)
+        patient = Patient.objects.create(name='Asha', age=34, gender='F')
+        self.assertEqual(metrics.counts()['patient_count'], 1)
+
+        # Rows added since are counted even though nothing adjusted this instance
+        Patient.objects.create(name='Ravi', age=51, gender='M')
+        write_report(patient.id, 'Report')
+        with CaptureQueriesContext(connection) as queries:
+            counts = metrics.counts()
+        self.assertEqual((counts['patient_count'], counts['report_count']), (2, 1))
+        # Both totals come from the rollups, not a COUNT over the tables
+        self.assertFalse([query for query in queries if Patient._meta.db_table in query['sql']])
+
+
+class DashboardWidgetAPITests(TestCase):
+    def setUp(self):
+        get_dashboard_metrics().clear()
+
+    def test_widgets_send_etags_and_honour_if_none_match(self):
+        Patient.objects.create(name='Asha', age=34, gender='F')
+        for name in ('counts', 'chart', 'recent_reports', 'common_diseases'):
+            url = reverse(f'health_predictor:api_dashboard_{name}')
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('max-age', response['Cache-Control'])
+
+            revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(revalidated.status_code, 304)
+
+        self.assertEqual(
+            self.client.get(reverse('health_predictor:api_dashboard_counts')).json()['patient_count'], 1
+        )
+
+
+class PatientListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        created_at = timezone.now()
+        cls.patients = [Patient.objects.create(name=f'Patient {i}', age=30, gender='F') for i in range(25)]
+        # Several patients share a timestamp, so the id breaks ties
+        Patient.objects.update(created_at=created_at)
+        write_reports([ReportDraft(cls.patients[0].id, 'Report')] * 3)
+
+    def test_api_pages_forward_and_back_without_overlap(self):
+        url = reverse('health_predictor:api_patient_list')
+        seen = []
+        pages = []
+        cursor = None
+        while True:
+            with self.assertNumQueries(1):
+                data = self.client.get(url, {'limit': 10, **({'after': cursor} if cursor else {})}).json()
+            pages.append(data)
+            seen.extend(patient['id'] for patient in data['results'])
+            cursor = data['next']
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted((patient.id for patient in self.patients), reverse=True))
+
+        previous = self.client.get(url, {'limit': 10, 'before': pages[2]['previous']}).json()
+        self.assertEqual(previous['results'], pages[1]['results'])
+        counts = {patient['id']: patient['report_count'] for page in pages for patient in page['results']}
+        self.assertEqual(counts[self.patients[0].id], 3)
+        self.assertEqual(sum(counts.values()), 3)
+
+        self.assertEqual(self.client.get(url, {'after': 'not-a-cursor'}).status_code, 400)
+
+    def test_list_view_counts_reports_in_the_page_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('health_predictor:patient_list'))
+        self.assertEqual(len(response.context['patients']), 10)
+        self.assertTrue(response.context['page_obj'].has_next())
+        self.assertEqual(self.client.get(reverse('health_predictor:patient_list'), {'after': 'x'}).status_code, 404)
+
+
+class PatientSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.asha = Patient.objects.create(name='Asha Menon', age=34, gender='F', email='asha@example.com')
+        cls.ravi = Patient.objects.create(name='Ravi Kumar', age=51, gender='M', email='ravi.asha@example.com',
+                                          phone='555-0142')
+        Patient.objects.create(name='Mei Lin', age=29, gender='F', phone='555-0199')
+
+    def test_prefix_matches_are_ranked_by_name_first(self):
+        self.assertEqual(search_patient_ids('ash'), [self.asha.id, self.ravi.id])
+        self.assertEqual(search_patient_ids('asha men'), [self.asha.id])
+        self.assertEqual(search_patient_ids('0142'), [self.ravi.id])
+        self.assertEqual(search_patient_ids('"*) OR'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.asha.name = 'Asha Pillai'
+        self.asha.save()
+        self.assertEqual(search_patient_ids('menon'), [])
+        self.assertEqual(search_patient_ids('pillai'), [self.asha.id])
+        self.ravi.delete()
+        self.assertEqual(search_patient_ids('ravi'), [])
+
+    def test_api_and_list_view_use_the_index(self):
+        data = self.client.get(reverse('health_predictor:api_patient_search'), {'q': 'mei'}).json()
+        self.assertEqual([patient['name'] for patient in data['results']], ['Mei Lin'])
+        self.assertEqual(data['results'][0]['report_count'], 0)
+
+        response = self.client.get(reverse('health_predictor:patient_list'), {'q': 'asha'})
+        self.assertEqual([patient.id for patient in response.context['patients']], [self.asha.id, self.ravi.id])
+        # The live search is wired up by main.js through the endpoint in data-search-url
+        self.assertContains(response, 'js/main.js')
+        self.assertContains(response, f'data-search-url="{reverse("health_predictor:api_patient_search")}"')
+        # Only the pages that use it load main.js; its form styling would restyle other forms
+        self.assertNotContains(self.client.get(reverse('health_predictor:patient_create')), 'js/main.js')
+
+
+class PatientReportHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.symptoms = [Symptom.objects.create(name=f'Symptom {i}', description='') for i in range(3)]
+        cls.disease = Disease.objects.create(name='Flu', description='')
+        cls.patient = Patient.objects.create(name='Asha', age=34, gender='F')
+        write_reports([
+            ReportDraft(cls.patient.id, f'Report {i}', [symptom.id for symptom in cls.symptoms[:i % 4]],
+                        [cls.disease.id])
+            for i in range(25)
+        ])
+
+    def test_history_is_paged_with_counts_from_one_query(self):
+        # Patient, then the page of reports with their counts
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('health_predictor:patient_detail', kwargs={'pk': self.patient.pk}))
+        reports = response.context['reports']
+        self.assertEqual(len(reports), 20)
+        self.assertTrue(reports.has_next())
+        # main.js fetches the next page from the button's data attributes
+        self.assertContains(response, 'js/main.js')
+        self.assertContains(response, 'data-url="%s"' % reverse(
+            'health_predictor:api_patient_reports', kwargs={'pk': self.patient.pk}))
+        self.assertContains(response, f'data-cursor="{reports.next_cursor}"')
+        for report in reports:
+            self.assertEqual(report.symptom_count, report.symptoms.count())
+            self.assertEqual(report.disease_count, 1)
+
+        data = self.client.get(reverse('health_predictor:api_patient_reports', kwargs={'pk': self.patient.pk}),
+                               {'after': reports.next_cursor}).json()
+        self.assertEqual(len(data['results']), 5)
+        self.assertIsNone(data['next'])
+        self.assertEqual(
+            {report.id for report in reports} | {report['id'] for report in data['results']},
+            set(self.patient.reports.values_list('id', flat=True)),
+        )
+
+
+class PatientImportTests(TestCase):
+    def test_command_imports_valid_rows_in_chunks_and_reports_rejects(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'patients.csv')
+            rejects = os.path.join(directory, 'rejects.ndjson')
+            with open(path, 'w', newline='') as stream:
+                stream.write(
+                    'name,age,gender,email,phone\n'
+                    'Asha Menon,34,F,asha@example.com,\n'
+                    'Ravi Kumar,51,M,,555-0142\n'
+                    'No Age,,F,,\n'
+                    'Mei Lin,29,F,not-an-email,\n'
+                    'Sam Ortiz,40,O,,\n'
+                )
+            out = io.StringIO()
+            call_command('import_patients', path, chunk_size=2, rejects=rejects, stdout=out)
+            with open(rejects) as stream:
+                rejected = [json.loads(line) for line in stream]
+
+        self.assertEqual(
+            sorted(Patient.objects.values_list('name', 'email', 'phone')),
+            [('Asha Menon', 'asha@example.com', None), ('Ravi Kumar', None, '555-0142'), ('Sam Ortiz', None, None)],
+        )
+        self.assertEqual([(row['line'], list(row['errors'])) for row in rejected], [(4, ['age']), (5, ['email'])])
+        self.assertIn('Imported 3 patients', out.getvalue())
+        self.assertEqual(patient_total(), 3)
+        # Imported rows are in the search index, and later writes are still indexed
+        self.assertEqual(len(search_patient_ids('ravi')), 1)
+        Patient.objects.create(name='Ravi Shah', age=22, gender='M')
+        self.assertEqual(len(search_patient_ids('ravi')), 2)
+
+    def test_repeated_values_are_cleaned_once(self):
+        validator = PatientValidator()
+        age = validator.fields['age']
+        with mock.patch.object(age, 'clean', wraps=age.clean):
+            results = [
+                validator.clean({'name': name, 'age': raw, 'gender': 'F'})
+                for name, raw in (('Asha', '34'), ('Mei', '34'), ('Bool', True), ('Bool', True))
+            ]
+            # '34' once, and JSON true is not served the cached 34
+            self.assertEqual(age.clean.call_count, 3)
+        self.assertEqual([values['age'] for values, errors in results[:2]], [34, 34])
+        self.assertEqual([list(errors) for values, errors in results[2:]], [['age'], ['age']])
+
+    def test_ndjson_rows_and_dry_run(self):
+        stream = io.StringIO('{"name": "Asha", "age": 34, "gender": "F"}\n\nnot json\n[1]\n')
+        rejects = []
+        self.assertEqual(import_patients(read_rows(stream, 'ndjson'), dry_run=True, reject=rejects.append), (1, 2))
+        self.assertEqual([reject.line for reject in rejects], [3, 4])
+        self.assertFalse(Patient.objects.exists())
+
+
+class ReportExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fever = Symptom.objects.create(name='Fever', description='High temperature')
+        cls.flu = Disease.objects.create(name='Flu', description='Influenza')
+        cls.rest = Remedy.objects.create(name='Rest', description='Sleep', instructions='', remedy_type='LIFESTYLE')
+        cls.asha = Patient.objects.create(name='Asha', age=34, gender='F')
+        cls.ravi = Patient.objects.create(name='Ravi', age=51, gender='M')
+        cls.reports = write_reports(
+            [ReportDraft(cls.asha.id, f'Asha {i}', [cls.fever.id], [cls.flu.id], [cls.rest.id]) for i in range(12)]
+            + [ReportDraft(cls.ravi.id, 'Ravi', [cls.fever.id], status='COMPLETED')]
+        )
+
+    def test_single_report_csv_streams(self):
+        report = self.reports[0]
+        response = self.client.get(reverse('health_predictor:report_export', kwargs={'pk': report.pk, 'format': 'csv'}))
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], ['Health Report', 'Asha 0'])
+        self.assertIn(['Fever', 'High temperature'], rows)
+        self.assertIn(['Rest', 'Lifestyle Change', 'Sleep'], rows)
+
+    def test_bulk_rows_load_links_per_chunk(self):
+        # The reports, then one query per relation for each chunk of five
+        with self.assertNumQueries(1 + 3 * 3):
+            rows = list(bulk_rows(filter_reports(patient=self.asha.id), chunk_size=5))
+        self.assertEqual(len(rows), 13)
+        self.assertEqual(rows[1][1:4] + rows[1][5:8], ['Asha 0', 'Asha', 'DRAFT', 'Fever', 'Flu', 'Rest'])
+
+    def test_bulk_export_endpoint_and_command_filter(self):
+        url = reverse('health_predictor:report_bulk_export')
+        self.assertEqual(self.client.get(url, {'status': 'COMPLETED'}).status_code, 302)
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.assertEqual(self.client.get(url, {'status': 'COMPLETED'}).status_code, 302)
+
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 400)
+        response = self.client.get(url, {'status': 'COMPLETED'})
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([row[1] for row in rows[1:]], ['Ravi'])
+        self.assertEqual(self.client.get(url, {'status': 'LOST'}).status_code, 400)
+
+        today = timezone.localdate()
+        out = io.StringIO()
+        call_command('export_reports', start=str(today), end=str(today), stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 14)
+        out = io.StringIO()
+        call_command('export_reports', end=str(today - datetime.timedelta(days=1)), stdout=out)
+        self.assertEqual(out.getvalue().splitlines(), [','.join(BULK_HEADER)])
+
+
+class ReportPDFTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        symptoms = [Symptom.objects.create(name=f'Symptom {i}', description='', body_part='Head') for i in range(5)]
+        flu = Disease.objects.create(name='Flu', description='Influenza (seasonal)')
+        remedies = [
+            Remedy.objects.create(name=f'Remedy {i}', description='', instructions='Daily', remedy_type='DIET')
+            for i in range(4)
+        ]
+        patient = Patient.objects.create(name='Asha', age=34, gender='F')
+        cls.report = write_report(patient.id, 'Checkup', [symptom.id for symptom in symptoms], [flu.id],
+                                  [remedy.id for remedy in remedies], status='SHARED')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = ReportPDFCache(directory.name)
+        patcher = mock.patch.object(views, 'get_report_pdf_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def download(self):
+        response = self.client.get(reverse('health_predictor:report_export', kwargs={'pk': self.report.pk, 'format': 'pdf'}))
+        return response, b''.join(response.streaming_content)
+
+    def test_pdf_is_rendered_once_per_revision(self):
+        # The revision columns, then the report with its patient and one query per relation
+        with self.assertNumQueries(1 + 4):
+            response, data = self.download()
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(data.startswith(b'%PDF-1.4') and data.rstrip().endswith(b'%%EOF'))
+        self.assertEqual(len(os.listdir(self.cache.directory)), 1)
+
+        # A cache hit reads only the revision columns
+        with self.assertNumQueries(1):
+            self.assertEqual(self.download()[1], data)
+
+        self.report.status = 'COMPLETED'
+        self.report.save()
+        self.download()
+        self.assertEqual(os.listdir(self.cache.directory), [os.path.basename(self.cache.path_for(self.report))])
+
+    def test_prerender_command_warms_shared_reports(self):
+        with mock.patch('health_predictor.management.commands.prerender_report_pdfs.get_report_pdf_cache',
+                        return_value=self.cache):
+            call_command('prerender_report_pdfs', stdout=io.StringIO())
+        self.assertIsNotNone(self.cache.get(self.report))
+
+    @override_settings(MEDIA_ROOT='', REPORT_PDF_CACHE={})
+    def test_cache_directory_must_be_configured(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ReportPDFCache.from_settings()
+        with override_settings(MEDIA_ROOT=self.cache.directory):
+            self.assertEqual(ReportPDFCache.from_settings().directory,
+                             os.path.join(self.cache.directory, 'report_pdfs'))
+
+
+class ReportDetailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        symptoms = [Symptom.objects.create(name=f'Symptom {i}', description='') for i in range(4)]
+        diseases = [Disease.objects.create(name=f'Disease {i}', description='') for i in range(3)]
+        remedy = Remedy.objects.create(name='Rest', description='Sleep', instructions='', remedy_type='LIFESTYLE')
+        patient = Patient.objects.create(name='Asha', age=34, gender='F')
+        cls.report = write_report(patient.id, 'Checkup', [symptom.id for symptom in symptoms],
+                                  [diseases[2].id, diseases[0].id], [remedy.id])
+
+    @override_settings(CATALOG_SNAPSHOT={'CHECK_INTERVAL': 60})
+    def test_detail_and_shared_views_stay_within_query_budget(self):
+        get_snapshot()
+        for url in (
+            reverse('health_predictor:report_detail', kwargs={'pk': self.report.pk}),
+            reverse('health_predictor:report_shared', kwargs={'uuid': self.report.uuid}),
+        ):
+            # The report with its patient, then the links of all three relations
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([disease.name for disease in response.context['diseases']], ['Disease 2', 'Disease 0'])
+            self.assertEqual(len(response.context['symptoms']), 4)
+            self.assertContains(response, 'Lifestyle Change')
+
+    def test_links_missing_from_a_stale_snapshot_are_read_from_the_database(self):
+        stale = get_snapshot()
+        cough = Symptom.objects.create(name='Cough', description='')
+        self.report.symptoms.add(cough)
+
+        with self.assertNumQueries(2):
+            symptoms, diseases, _ = views.report_relations(self.report, stale)
+        self.assertEqual([symptom.name for symptom in symptoms][-1], 'Cough')
+        self.assertEqual(len(symptoms), 5)
+        self.assertEqual(len(diseases), 2)
+
+
+class BatchPredictionAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fever = Symptom.objects.create(name='Fever', description='', severity_level=5)
+        cls.cough = Symptom.objects.create(name='Cough', description='', severity_level=3)
+        cls.flu = Disease.objects.create(name='Flu', description='')
+        cls.flu.symptoms.set([cls.fever, cls.cough])
+
+    def post(self, body, content_type='application/json', **params):
+        url = reverse('health_predictor:api_prediction_batch')
+        if params:
+            url += '?' + '&'.join(f'{key}={value}' for key, value in params.items())
+        response = self.client.post(url, body, content_type=content_type)
+        if not response.streaming:
+            return response, None
+        return response, [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_bad_weighted_symptom_data_gets_an_error_line(self):
+        entries = [
+            {'symptoms': [self.fever.id], 'symptom_data': {str(self.fever.id): {'severity': 'high'}}},
+            {'symptoms': [self.fever.id], 'symptom_data': {str(self.fever.id): {'severity': 11}}},
+            {'symptoms': [self.fever.id], 'symptom_data': {str(self.fever.id): {'duration': 'forever'}}},
+            {'symptoms': [self.fever.id], 'symptom_data': {str(self.fever.id): {'severity': 7, 'duration': 'days'}}},
+            {'symptoms': [True]},
+        ]
+        _, lines = self.post(json.dumps(entries), mode='weighted')
+        self.assertEqual([line['index'] for line in lines], [0, 1, 2, 3, 4])
+        self.assertEqual(['error' in line for line in lines], [True, True, True, False, True])
+        self.assertEqual(lines[3]['diseases'][0]['name'], 'Flu')
+
+    def test_json_array_and_ndjson_bodies_give_the_same_lines(self):
+        entries = [{'id': 'kiosk-1', 'symptoms': [self.fever.id]}, {'id': 'kiosk-2', 'symptoms': [self.cough.id]}]
+        response, from_array = self.post(json.dumps(entries))
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        _, from_object = self.post(json.dumps({'patients': entries}))
+        _, from_ndjson = self.post('\n'.join(json.dumps(entry) for entry in entries) + '\n',
+                                   content_type='application/x-ndjson')
+
+        self.assertEqual([line['id'] for line in from_array], ['kiosk-1', 'kiosk-2'])
+        self.assertEqual(from_array[0]['diseases'][0]['name'], 'Flu')
+        self.assertEqual(from_object, from_array)
+        self.assertEqual(from_ndjson, from_array)
+
+    def test_bad_entries_get_an_error_line_and_the_rest_succeed(self):
+        body = '\n'.join([
+            json.dumps({'id': 'ok', 'symptoms': [self.fever.id]}),
+            '{not json',
+            json.dumps([self.fever.id]),
+            json.dumps({'id': 'empty', 'symptoms': []}),
+            json.dumps({'symptoms': ['fever']}),
+            json.dumps({'id': 'also-ok', 'symptoms': [self.cough.id]}),
+        ])
+        _, lines = self.post(body, content_type='application/x-ndjson')
+
+        self.assertEqual([line['index'] for line in lines], [0, 1, 2, 3, 4, 5])
+        self.assertEqual(['error' in line for line in lines], [False, True, True, True, True, False])
+        self.assertEqual(lines[3]['id'], 'empty')
+        self.assertEqual(lines[5]['diseases'][0]['name'], 'Flu')
+
+    def test_invalid_parameters_and_bodies_are_rejected(self):
+        body = json.dumps([{'symptoms': [self.fever.id]}])
+        self.assertEqual(self.post(body, limit='many')[0].status_code, 400)
+        self.assertEqual(self.post(body, mode='magic')[0].status_code, 400)
+        self.assertEqual(self.post('{not json')[0].status_code, 400)
+        self.assertEqual(self.post(json.dumps({'symptoms': [self.fever.id]}))[0].status_code, 400)
+
+    def test_limit_is_clamped(self):
+        Disease.objects.create(name='Cold', description='').symptoms.add(self.fever)
+        body = json.dumps([{'symptoms': [self.fever.id]}])
+        self.assertEqual(len(self.post(body, limit=1)[1][0]['diseases']), 1)
+        self.assertEqual(len(self.post(body, limit=0)[1][0]['diseases']), 1)
+        self.assertEqual(len(self.post(body, limit=500)[1][0]['diseases']), 2)
+
+    def test_entries_spanning_several_chunks_stay_in_order(self):
+        entries = [{'id': index, 'symptoms': [self.fever.id] if index % 3 else ['bad']} for index in range(7)]
+        with mock.patch.object(views.BatchPredictionAPIView, 'chunk_size', 2):
+            _, lines = self.post(json.dumps(entries))
+
+        self.assertEqual([line['id'] for line in lines], list(range(7)))
+        self.assertEqual(['error' in line for line in lines], [index % 3 == 0 for index in range(7)])
+        self.assertTrue(all(line['diseases'][0]['name'] == 'Flu' for line in lines if 'error' not in line))
@@ -26,11 +26,22 @@ urlpatterns = [
     
     # Report URLs
     path('reports/<int:pk>/', views.ReportDetailView.as_view(), name='report_detail'),
+    path('reports/export/', views.ReportBulkExportView.as_view(), name='report_bulk_export'),
     path('reports/shared/<uuid:uuid>/', views.ReportDetailView.as_view(), name='report_shared'),
     path('reports/<int:pk>/edit/', views.ReportUpdateView.as_view(), name='report_update'),
     path('reports/<int:pk>/share/', views.ReportShareView.as_view(), name='report_share'),
     path('reports/<int:pk>/export/<str:format>/', views.ReportExportView.as_view(), name='report_export'),
     
     # API endpoints
+    path('api/patients/', views.PatientListAPIView.as_view(), name='api_patient_list'),
+    path('api/patients/search/', views.PatientSearchAPIView.as_view(), name='api_patient_search'),
+    path('api/patients/<int:pk>/reports/', views.PatientReportsAPIView.as_view(), name='api_patient_reports'),
     path('api/symptoms/search/', views.SymptomSearchAPIView.as_view(), name='api_symptom_search'),
+    path('api/predictions/batch/', views.BatchPredictionAPIView.as_view(), name='api_prediction_batch'),
+    path('api/predictions/cache/', views.PredictionCacheStatsAPIView.as_view(), name='api_prediction_cache'),
+    path('api/reports/queue/', views.ReportQueueStatsAPIView.as_view(), name='api_report_queue'),
+    path('api/dashboard/counts/', views.DashboardCountsAPIView.as_view(), name='api_dashboard_counts'),
+    path('api/dashboard/chart/', views.DashboardChartAPIView.as_view(), name='api_dashboard_chart'),
+    path('api/dashboard/recent-reports/', views.DashboardRecentReportsAPIView.as_view(), name='api_dashboard_recent_reports'),
+    path('api/dashboard/common-diseases/', views.DashboardCommonDiseasesAPIView.as_view(), name='api_dashboard_common_diseases'),
 ]
\ No newline at end of file
@@ -3,19 +3,35 @@ from django.views import View
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy, reverse
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse, FileResponse
-from django.db.models import Count, Q
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse, FileResponse, StreamingHttpResponse
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
+from django.views.decorators.csrf import csrf_exempt
 
 from .models import Patient, Symptom, Disease, Remedy, Report
-from .forms import PatientForm, SymptomChecklistForm, SymptomSeverityForm, ReportForm, SymptomSearchForm
+from .catalog import get_snapshot, get_top_k
+from .pagination import InvalidCursor, KeysetPaginator
+from .patient_search import search_patients
+from .dashboard import GRANULARITY_CHOICES, RANGE_CHOICES, get_dashboard_metrics, report_series
+from .report_export import bulk_rows, export_queryset, filter_reports, report_rows, stream_csv
+from .report_pdf import get_report_pdf_cache, pdf_queryset
+from .report_queue import get_report_queue, report_queue_stats, write_behind_enabled
+from .report_writer import ReportDraft, write_reports
+from .result_cache import get_prediction_cache
+from .prediction import SCORING_MODES, check_symptom_data
+from .forms import (
+    PatientForm, SymptomChecklistForm, SymptomSeverityForm, ReportForm, SymptomSearchForm, ReportExportFilterForm,
+)
 
+import hashlib
 import json
-import io
-import csv
 import uuid
-import datetime
 
 # Home view
 class HomeView(View):
@@ -23,62 +39,105 @@ class HomeView(View):
         return render(request, 'health_predictor/home.html')
 
 # Dashboard view
+def parse_chart_options(request):
+    """Return the ``(range, granularity)`` requested for the dashboard chart"""
+    chart_range = request.GET.get('range', '7')
+    chart_range = int(chart_range) if chart_range.isdigit() and int(chart_range) in RANGE_CHOICES else 7
+    granularity = request.GET.get('granularity', 'day')
+    if granularity not in GRANULARITY_CHOICES:
+        granularity = 'day'
+    return chart_range, granularity
+
 class DashboardView(View):
     def get(self, request):
-        # Get counts for dashboard metrics
-        patient_count = Patient.objects.count()
-        report_count = Report.objects.count()
-        symptom_count = Symptom.objects.count()
-        
-        # Get recent reports
-        recent_reports = Report.objects.select_related('patient').order_by('-created_at')[:5]
-        
-        # Get common diseases
-        common_diseases = Disease.objects.annotate(count=Count('reports')).order_by('-count')[:5]
-        
-        # Generate chart data for the last 7 days
-        today = timezone.now().date()
-        date_labels = [(today - datetime.timedelta(days=i)).strftime('%b %d') for i in range(6, -1, -1)]
-        
-        # Count reports for each day
-        report_data = []
-        for i in range(6, -1, -1):
-            date = today - datetime.timedelta(days=i)
-            count = Report.objects.filter(
-                created_at__year=date.year,
-                created_at__month=date.month,
-                created_at__day=date.day
-            ).count()
-            report_data.append(count)
+        # Widgets load their own data from the dashboard API after first paint
+        chart_range, granularity = parse_chart_options(request)
         
         context = {
-            'patient_count': patient_count,
-            'report_count': report_count,
-            'symptom_count': symptom_count,
-            'recent_reports': recent_reports,
-            'common_diseases': common_diseases,
-            'chart_labels': json.dumps(date_labels),
-            'chart_data': json.dumps(report_data)
+            'chart_range': chart_range,
+            'granularity': granularity,
+            'range_choices': RANGE_CHOICES,
+            'granularity_choices': GRANULARITY_CHOICES,
         }
         
         return render(request, 'health_predictor/dashboard.html', context)
 
 # Patient views
+def patients_with_report_counts():
+    """Patients annotated with ``report_count``, counted only for the rows fetched"""
+    return Patient.objects.annotate(report_count=link_count(Report, 'patient'))
+
+def patient_json(patient):
+    return {
+        'id': patient.id,
+        'name': patient.name,
+        'age': patient.age,
+        'gender': patient.gender,
+        'email': patient.email,
+        'phone': patient.phone,
+        'created_at': patient.created_at.isoformat(),
+        'report_count': patient.report_count,
+        'url': reverse('health_predictor:patient_detail', kwargs={'pk': patient.pk}),
+    }
+
 class PatientListView(ListView):
     model = Patient
     template_name = 'health_predictor/patient_list.html'
     context_object_name = 'patients'
-    ordering = ['-created_at']
+    ordering = ['-created_at', '-id']
     paginate_by = 10
+    
+    search_limit = 50
+    
+    def get_queryset(self):
+        self.query = self.request.GET.get('q', '').strip()
+        if self.query:
+            # Ranked matches, best first, instead of pages
+            return search_patients(self.query, self.search_limit, patients_with_report_counts())
+        return patients_with_report_counts()
+    
+    def get_paginate_by(self, queryset):
+        return None if self.query else self.paginate_by
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.query
+        return context
+    
+    def paginate_queryset(self, queryset, page_size):
+        # Keyset pagination: no OFFSET and no COUNT, however deep the page
+        paginator = KeysetPaginator(queryset, self.ordering, page_size)
+        page = paginator.page(after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+REPORT_HISTORY_ORDERING = ('-created_at', '-id')
+
+def link_count(through, column='report_id'):
+    """Subquery counting ``through`` rows that point at the outer row"""
+    return Coalesce(Subquery(
+        through.objects.filter(**{column: OuterRef('pk')}).order_by().values(column).annotate(
+            count=Count('pk')).values('count')
+    ), 0)
+
+def reports_with_link_counts(queryset):
+    """Annotate ``symptom_count`` and ``disease_count`` in the same query as the reports"""
+    return queryset.annotate(
+        symptom_count=link_count(Report.symptoms.through),
+        disease_count=link_count(Report.predicted_diseases.through),
+    )
 
 class PatientDetailView(DetailView):
     model = Patient
     template_name = 'health_predictor/patient_detail.html'
     context_object_name = 'patient'
     
+    reports_per_page = 20
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['reports'] = self.object.reports.all().order_by('-created_at')
+        paginator = KeysetPaginator(reports_with_link_counts(self.object.reports.all()), REPORT_HISTORY_ORDERING,
+                                    self.reports_per_page)
+        context['reports'] = paginator.page(after=self.request.GET.get('after'))
         return context
 
 class PatientCreateView(CreateView):
@@ -106,6 +165,28 @@ class PatientUpdateView(UpdateView):
         return super().form_valid(form)
 
 # Symptom analysis and disease prediction views
+def start_assessment(session):
+    """Give the assessment in ``session`` a new token, forgetting any saved report"""
+    session['assessment_token'] = uuid.uuid4().hex
+    session.pop('assessment_report', None)
+
+def saved_assessment_report(session, patient, mode):
+    """Return the uuid of the report already saved for this assessment, patient and scoring mode, if any"""
+    saved = session.get('assessment_report')
+    if (patient and saved and saved['token'] == session.get('assessment_token')
+            and saved['patient_id'] == patient.id and mode in saved.get('reports', {})):
+        return uuid.UUID(saved['reports'][mode])
+    return None
+
+def save_assessment_report(session, patient, mode, report_uuid):
+    saved = session.get('assessment_report')
+    if not (saved and 'reports' in saved and saved['token'] == session.get('assessment_token')
+            and saved['patient_id'] == patient.id):
+        saved = {'token': session.get('assessment_token'), 'patient_id': patient.id, 'reports': {}}
+    # Each scoring mode ranks differently, so each gets its own report
+    saved['reports'][mode] = str(report_uuid)
+    session['assessment_report'] = saved
+
 class SymptomCheckerView(View):
     def get(self, request, patient_id=None):
         patient = None
@@ -139,8 +220,9 @@ class SymptomCheckerView(View):
                 messages.warning(request, "Please select at least one symptom.")
                 return redirect('health_predictor:symptom_checker', patient_id=patient_id)
             
-            # Store selected symptoms in session
+            # Store selected symptoms in session, under a fresh assessment token
             request.session['selected_symptoms'] = selected_symptoms
+            start_assessment(request.session)
             
             # Redirect to severity assessment
             if patient_id:
@@ -166,7 +248,7 @@ class SymptomSeverityView(View):
             messages.warning(request, "Please select symptoms first.")
             return redirect('health_predictor:symptom_checker', patient_id=patient_id)
         
-        selected_symptoms = Symptom.objects.filter(id__in=selected_symptom_ids)
+        selected_symptoms = get_snapshot().symptoms_for(selected_symptom_ids)
         severity_form = SymptomSeverityForm(symptoms=selected_symptoms)
         
         return render(request, 'health_predictor/symptom_severity.html', {
@@ -186,7 +268,7 @@ class SymptomSeverityView(View):
             messages.warning(request, "Please select symptoms first.")
             return redirect('health_predictor:symptom_checker', patient_id=patient_id)
         
-        selected_symptoms = Symptom.objects.filter(id__in=selected_symptom_ids)
+        selected_symptoms = get_snapshot().symptoms_for(selected_symptom_ids)
         form = SymptomSeverityForm(symptoms=selected_symptoms, data=request.POST)
         
         if form.is_valid():
@@ -200,8 +282,9 @@ class SymptomSeverityView(View):
                     'duration': duration,
                 }
             
-            # Store symptom data in session
+            # Store symptom data in session; new answers are a new assessment
             request.session['symptom_data'] = symptom_data
+            start_assessment(request.session)
             
             # Redirect to results
             if patient_id:
@@ -229,32 +312,48 @@ class PredictionResultsView(View):
             messages.warning(request, "Please complete the symptom assessment first.")
             return redirect('health_predictor:symptom_checker', patient_id=patient_id)
         
-        # Get the selected symptoms
-        symptoms = Symptom.objects.filter(id__in=selected_symptom_ids)
+        # Use one catalog snapshot for the whole request
+        catalog = get_snapshot()
         
-        # Predict diseases based on symptoms
-        # This is a simple implementation. In a real-world scenario, you would use a more sophisticated algorithm.
-        predicted_diseases = Disease.objects.filter(symptoms__in=symptoms).annotate(
-            symptom_count=Count('symptoms', filter=Q(symptoms__in=symptoms))
-        ).order_by('-symptom_count', '-severity_level')[:5]
+        # Get the selected symptoms
+        symptoms = catalog.symptoms_for(selected_symptom_ids)
+        
+        # Predict diseases based on symptoms using the in-memory symptom index
+        scoring_mode = request.GET.get('mode', 'count')
+        if scoring_mode not in SCORING_MODES:
+            scoring_mode = 'count'
+        ranking, remedy_ids = catalog.predict(
+            selected_symptom_ids, mode=scoring_mode, symptom_data=symptom_data
+        )
+        predicted_diseases = catalog.load_diseases(ranking)
         
         # Get recommended remedies for the predicted diseases and symptoms
-        recommended_remedies = Remedy.objects.filter(
-            Q(diseases__in=predicted_diseases) | Q(symptoms__in=symptoms)
-        ).distinct().order_by('-effectiveness_rating')
+        recommended_remedies = catalog.load_remedies(remedy_ids)
         
-        # Create a new report if patient exists
+        # Create a new report if patient exists, once per assessment
         report = None
-        if patient:
-            report = Report.objects.create(
-                patient=patient,
+        queued_report_uuid = None
+        saved = saved_assessment_report(request.session, patient, scoring_mode)
+        if saved is not None:
+            report = Report.objects.filter(uuid=saved).first()
+            if report is None and write_behind_enabled():
+                # Still waiting in the write-behind queue
+                queued_report_uuid = saved
+        if patient and report is None and queued_report_uuid is None:
+            draft = ReportDraft(
+                patient.id,
                 title=f"Health Report - {timezone.now().strftime('%Y-%m-%d')}",
-                status='DRAFT'
+                symptom_ids=[symptom.id for symptom in symptoms],
+                disease_ids=[disease.id for disease in predicted_diseases],
+                remedy_ids=[remedy.id for remedy in recommended_remedies],
             )
-            report.symptoms.set(symptoms)
-            report.predicted_diseases.set(predicted_diseases)
-            report.recommended_remedies.set(recommended_remedies)
-            report.save()
+            if write_behind_enabled():
+                # Render now and let the background writer persist the report
+                queued_report_uuid = uuid.uuid4()
+                get_report_queue().put(draft._replace(uuid=queued_report_uuid))
+            else:
+                report = write_reports([draft])[0]
+            save_assessment_report(request.session, patient, scoring_mode, queued_report_uuid or report.uuid)
         
         context = {
             'patient': patient,
@@ -263,22 +362,65 @@ class PredictionResultsView(View):
             'predicted_diseases': predicted_diseases,
             'recommended_remedies': recommended_remedies,
             'report': report,
+            'queued_report_uuid': queued_report_uuid,
+            'scoring_mode': scoring_mode,
         }
         
         return render(request, 'health_predictor/prediction_results.html', context)
 
 # Report views
+def report_relations(report, catalog=None):
+    """Return the ``(symptoms, diseases, remedies)`` catalog records linked to ``report``.
+    
+    The link ids of all three relations come from one query; the records
+    themselves come from the in-memory catalog snapshot. Records the
+    snapshot does not have yet, such as a symptom added since it was built,
+    are read from the database. Each list is in the order the links were
+    written.
+    """
+    catalog = catalog or get_snapshot()
+    links = [
+        through.objects.filter(report_id=report.pk).annotate(
+            relation=Value(position, output_field=IntegerField())).values_list(column, 'pk', 'relation')
+        for position, (through, column) in enumerate((
+            (Report.symptoms.through, 'symptom_id'),
+            (Report.predicted_diseases.through, 'disease_id'),
+            (Report.recommended_remedies.through, 'remedy_id'),
+        ))
+    ]
+    ids = ([], [], [])
+    for target_id, link_id, relation in sorted(links[0].union(*links[1:], all=True), key=lambda row: row[1]):
+        ids[relation].append(target_id)
+    relations = []
+    for model, records, target_ids in zip(
+            (Symptom, Disease, Remedy), (catalog.symptoms, catalog.diseases, catalog.remedies), ids):
+        missing = [target_id for target_id in target_ids if target_id not in records]
+        fetched = model.objects.in_bulk(missing) if missing else {}
+        relations.append([
+            records[target_id] if target_id in records else fetched[target_id]
+            for target_id in target_ids if target_id in records or target_id in fetched
+        ])
+    return tuple(relations)
+
 class ReportDetailView(DetailView):
     model = Report
     template_name = 'health_predictor/report_detail.html'
     context_object_name = 'report'
     
+    def get_queryset(self):
+        return Report.objects.select_related('patient')
+    
     def get_object(self, queryset=None):
         # Allow retrieval by UUID for sharing
         uuid_string = self.kwargs.get('uuid')
         if uuid_string:
-            return get_object_or_404(Report, uuid=uuid_string)
+            return get_object_or_404(self.get_queryset(), uuid=uuid_string)
         return super().get_object(queryset)
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['symptoms'], context['diseases'], context['remedies'] = report_relations(self.object)
+        return context
 
 class ReportUpdateView(UpdateView):
     model = Report
@@ -290,7 +432,7 @@ class ReportUpdateView(UpdateView):
 
 class ReportShareView(View):
     def get(self, request, pk):
-        report = get_object_or_404(Report, pk=pk)
+        report = get_object_or_404(Report.objects.select_related('patient'), pk=pk)
         report.status = 'SHARED'
         report.save()
         
@@ -305,44 +447,24 @@ class ReportShareView(View):
 
 class ReportExportView(View):
     def get(self, request, pk, format='pdf'):
-        report = get_object_or_404(Report, pk=pk)
-        
         if format == 'pdf':
-            # Implementation for PDF export will be added later
-            # For now, we'll return a simple text response
-            return HttpResponse("PDF export functionality will be implemented soon.")
+            cache = get_report_pdf_cache()
+            report = get_object_or_404(Report.objects.only('uuid', 'updated_at'), pk=pk)
+            path = cache.get(report)
+            try:
+                stream = open(path, 'rb') if path else None
+            except FileNotFoundError:
+                # Replaced by a newer revision since the check
+                stream = None
+            if stream is None:
+                # Render from the full report only on a cache miss
+                stream = open(cache.render(get_object_or_404(pdf_queryset(), pk=pk)), 'rb')
+            return FileResponse(stream, as_attachment=True, filename=f'health_report_{report.uuid}.pdf',
+                                content_type='application/pdf')
         
         elif format == 'csv':
-            # Create CSV file
-            buffer = io.StringIO()
-            writer = csv.writer(buffer)
-            
-            # Write header
-            writer.writerow(['Health Report', report.title])
-            writer.writerow(['Patient', report.patient.name])
-            writer.writerow(['Date', report.created_at.strftime('%Y-%m-%d')])
-            writer.writerow([])
-            
-            # Write symptoms
-            writer.writerow(['Symptoms'])
-            for symptom in report.symptoms.all():
-                writer.writerow([symptom.name, symptom.description])
-            writer.writerow([])
-            
-            # Write predicted diseases
-            writer.writerow(['Predicted Conditions'])
-            for disease in report.predicted_diseases.all():
-                writer.writerow([disease.name, disease.description])
-            writer.writerow([])
-            
-            # Write recommended remedies
-            writer.writerow(['Recommended Remedies'])
-            for remedy in report.recommended_remedies.all():
-                writer.writerow([remedy.name, remedy.get_remedy_type_display(), remedy.description])
-            
-            # Create response
-            buffer.seek(0)
-            response = HttpResponse(buffer.read(), content_type='text/csv')
+            report = get_object_or_404(export_queryset(), pk=pk)
+            response = StreamingHttpResponse(stream_csv(report_rows(report)), content_type='text/csv')
             response['Content-Disposition'] = f'attachment; filename="health_report_{report.uuid}.csv"'
             
             return response
@@ -350,19 +472,35 @@ class ReportExportView(View):
         else:
             return HttpResponse("Unsupported export format", status=400)
 
+@method_decorator(staff_member_required, name='dispatch')
+class ReportBulkExportView(View):
+    """Stream every report matching ``?patient=&status=&start=&end=`` as one CSV, for staff only.
+
+    At least one filter is required; the ``export_reports`` management
+    command produces the full export.
+    """
+    def get(self, request):
+        form = ReportExportFilterForm(request.GET)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+        if not any(form.cleaned_data.values()):
+            return JsonResponse(
+                {'error': 'Filter by patient, status or date; use the export_reports command for a full export'},
+                status=400,
+            )
+        
+        reports = filter_reports(**form.cleaned_data)
+        response = StreamingHttpResponse(stream_csv(bulk_rows(reports)), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="health_reports.csv"'
+        return response
+
 # API endpoints for AJAX requests
 class SymptomSearchAPIView(View):
     def get(self, request):
         keyword = request.GET.get('keyword', '')
         body_part = request.GET.get('body_part', '')
         
-        symptoms = Symptom.objects.all()
-        
-        if keyword:
-            symptoms = symptoms.filter(Q(name__icontains=keyword) | Q(description__icontains=keyword))
-        
-        if body_part:
-            symptoms = symptoms.filter(body_part=body_part)
+        symptoms = get_snapshot().search_symptoms(keyword, body_part, limit=20)  # Limit to 20 results
         
         data = [{
             'id': symptom.id,
@@ -370,6 +508,270 @@ class SymptomSearchAPIView(View):
             'description': symptom.description,
             'body_part': symptom.body_part or 'General',
             'severity_level': symptom.severity_level,
-        } for symptom in symptoms[:20]]  # Limit to 20 results
+        } for symptom in symptoms]
         
         return JsonResponse({'symptoms': data})
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BatchPredictionAPIView(View):
+    """Predict diseases and remedies for many patients in one POST.
+
+    The body is either a JSON array (or ``{"patients": [...]}``) or, with
+    ``Content-Type: application/x-ndjson``, one JSON object per line. Each
+    entry looks like ``{"id": "kiosk-1", "symptoms": [1, 2, 3]}``, plus a
+    ``"symptom_data"`` mapping of severity and duration per symptom id for
+    ``?mode=weighted``. The response streams one NDJSON line per entry, in
+    input order.
+    """
+    chunk_size = 500
+    max_limit = 20
+
+    def post(self, request):
+        try:
+            limit = min(max(int(request.GET.get('limit', get_top_k())), 1), self.max_limit)
+        except ValueError:
+            return JsonResponse({'error': 'limit must be an integer'}, status=400)
+
+        mode = request.GET.get('mode', 'count')
+        if mode not in SCORING_MODES:
+            return JsonResponse({'error': f"mode must be one of {', '.join(SCORING_MODES)}"}, status=400)
+
+        if request.content_type == 'application/x-ndjson':
+            # Read line by line so large uploads are never held in memory
+            payloads = (line for line in request if line.strip())
+        else:
+            try:
+                payloads = json.loads(request.body)
+            except ValueError:
+                return JsonResponse({'error': 'Request body must be valid JSON'}, status=400)
+            if isinstance(payloads, dict):
+                payloads = payloads.get('patients')
+            if not isinstance(payloads, list):
+                return JsonResponse({'error': 'Expected a list of patients'}, status=400)
+
+        # Every chunk of the stream is scored against the same catalog snapshot
+        return StreamingHttpResponse(
+            self.stream_results(get_snapshot(), payloads, limit, mode),
+            content_type='application/x-ndjson',
+        )
+
+    def stream_results(self, catalog, payloads, limit, mode):
+        chunk = []
+        for index, payload in enumerate(payloads):
+            chunk.append((index, payload))
+            if len(chunk) >= self.chunk_size:
+                yield from self.predict_chunk(catalog, chunk, limit, mode)
+                chunk = []
+        if chunk:
+            yield from self.predict_chunk(catalog, chunk, limit, mode)
+
+    def predict_chunk(self, catalog, chunk, limit, mode):
+        entries = []
+        queries = []
+        for index, payload in chunk:
+            try:
+                if isinstance(payload, bytes):
+                    payload = json.loads(payload)
+                symptom_ids = self.parse_symptom_ids(payload)
+                # Validated here so one bad entry gets an error line instead of ending the stream
+                queries.append(self.weighted_query(payload, symptom_ids) if mode == 'weighted' else symptom_ids)
+                entries.append((index, payload, symptom_ids, None))
+            except ValueError as exc:
+                entries.append((index, payload, None, str(exc)))
+
+        valid = [entry for entry in entries if entry[3] is None]
+        rankings = dict(zip(
+            (entry[0] for entry in valid),
+            catalog.rank_diseases_batch(queries, limit=limit, mode=mode),
+        ))
+
+        recommendations = {
+            entry[0]: catalog.recommend_remedy_ids([disease_id for disease_id, _ in rankings[entry[0]]], entry[2])
+            for entry in valid
+        }
+
+        for index, payload, entry_symptom_ids, error in entries:
+            line = {'index': index}
+            if isinstance(payload, dict) and 'id' in payload:
+                line['id'] = payload['id']
+
+            if error:
+                line['error'] = error
+            else:
+                line['diseases'] = [
+                    self.disease_json(catalog.diseases[disease_id], score)
+                    for disease_id, score in rankings[index]
+                ]
+                line['remedies'] = [
+                    self.remedy_json(remedy) for remedy in catalog.load_remedies(recommendations[index])
+                ]
+            yield json.dumps(line) + '\n'
+
+    def parse_symptom_ids(self, payload):
+        if not isinstance(payload, dict):
+            raise ValueError('Each entry must be a JSON object')
+        symptom_ids = payload.get('symptoms')
+        if (not isinstance(symptom_ids, list) or not symptom_ids
+                or not all(isinstance(symptom_id, int) and not isinstance(symptom_id, bool)
+                           for symptom_id in symptom_ids)):
+            raise ValueError('"symptoms" must be a non-empty list of symptom ids')
+        return symptom_ids
+
+    def weighted_query(self, payload, symptom_ids):
+        symptom_data = payload.get('symptom_data')
+        if not isinstance(symptom_data, dict):
+            symptom_data = {}
+        query = {}
+        for symptom_id in symptom_ids:
+            data = symptom_data.get(str(symptom_id))
+            if data is None:
+                data = {}
+            elif not isinstance(data, dict):
+                raise ValueError(f'"symptom_data" for symptom {symptom_id} must be an object')
+            try:
+                check_symptom_data(data)
+            except ValueError as exc:
+                raise ValueError(f'Symptom {symptom_id}: {exc}') from exc
+            query[symptom_id] = data
+        return query
+
+    def disease_json(self, disease, score):
+        return {
+            'id': disease.id,
+            'name': disease.name,
+            'severity_level': disease.severity_level,
+            'score': score,
+        }
+
+    def remedy_json(self, remedy):
+        return {
+            'id': remedy.id,
+            'name': remedy.name,
+            'remedy_type': remedy.remedy_type,
+            'effectiveness_rating': remedy.effectiveness_rating,
+            'remedy_type_display': remedy.get_remedy_type_display(),
+        }
+
+class PredictionCacheStatsAPIView(View):
+    def get(self, request):
+        return JsonResponse(get_prediction_cache().stats())
+
+class ReportQueueStatsAPIView(View):
+    def get(self, request):
+        return JsonResponse(report_queue_stats())
+
+class DashboardWidgetAPIView(View):
+    """JSON data for one dashboard widget, with an ETag and a short private max-age"""
+    max_age = 30
+
+    def get(self, request):
+        response = JsonResponse(self.get_data(request), safe=False)
+        response['ETag'] = quote_etag(hashlib.md5(response.content).hexdigest())
+        patch_cache_control(response, private=True, max_age=self.max_age)
+        return get_conditional_response(request, etag=response['ETag'], response=response)
+
+    def get_data(self, request):
+        raise NotImplementedError
+
+class DashboardCountsAPIView(DashboardWidgetAPIView):
+    def get_data(self, request):
+        return get_dashboard_metrics().counts()
+
+class DashboardChartAPIView(DashboardWidgetAPIView):
+    max_age = 60
+
+    def get_data(self, request):
+        chart_range, granularity = parse_chart_options(request)
+        labels, data = report_series(chart_range, granularity)
+        return {'range': chart_range, 'granularity': granularity, 'labels': labels, 'data': data}
+
+class DashboardRecentReportsAPIView(DashboardWidgetAPIView):
+    def get_data(self, request):
+        return [{
+            'id': report.id,
+            'title': report.title,
+            'created_at': report.created_at.isoformat(),
+            'patient': report.patient.name,
+            'conditions': [disease.name for disease in report.predicted_diseases.all()],
+            'url': reverse('health_predictor:report_detail', kwargs={'pk': report.pk}),
+        } for report in get_dashboard_metrics().recent_reports(5)]
+
+class DashboardCommonDiseasesAPIView(DashboardWidgetAPIView):
+    max_age = 60
+
+    def get_data(self, request):
+        return [{
+            'id': disease['id'],
+            'name': disease['name'],
+            'description': disease['description'],
+            'count': disease['count'],
+        } for disease in get_dashboard_metrics().common_diseases(5)]
+
+class PatientListAPIView(View):
+    max_limit = 100
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.GET.get('limit', 20)), 1), self.max_limit)
+        except ValueError:
+            return JsonResponse({'error': 'limit must be an integer'}, status=400)
+
+        paginator = KeysetPaginator(patients_with_report_counts(), PatientListView.ordering, limit)
+        try:
+            page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+        except InvalidCursor:
+            return JsonResponse({'error': 'Invalid page cursor'}, status=400)
+
+        return JsonResponse({
+            'results': [patient_json(patient) for patient in page],
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        })
+
+
+class PatientSearchAPIView(View):
+    max_limit = 50
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.GET.get('limit', 10)), 1), self.max_limit)
+        except ValueError:
+            return JsonResponse({'error': 'limit must be an integer'}, status=400)
+
+        patients = search_patients(request.GET.get('q', ''), limit, patients_with_report_counts())
+        return JsonResponse({'results': [patient_json(patient) for patient in patients]})
+
+
+class PatientReportsAPIView(View):
+    """Further pages of a patient's report history, for the "load more" button"""
+    max_limit = 100
+
+    def get(self, request, pk):
+        patient = get_object_or_404(Patient, pk=pk)
+        try:
+            limit = min(max(int(request.GET.get('limit', PatientDetailView.reports_per_page)), 1), self.max_limit)
+        except ValueError:
+            return JsonResponse({'error': 'limit must be an integer'}, status=400)
+
+        paginator = KeysetPaginator(reports_with_link_counts(patient.reports.all()), REPORT_HISTORY_ORDERING, limit)
+        try:
+            page = paginator.page(after=request.GET.get('after'))
+        except InvalidCursor:
+            return JsonResponse({'error': 'Invalid page cursor'}, status=400)
+
+        return JsonResponse({
+            'results': [{
+                'id': report.id,
+                'title': report.title,
+                'status': report.status,
+                'status_display': report.get_status_display(),
+                'created_at': report.created_at.isoformat(),
+                'symptom_count': report.symptom_count,
+                'disease_count': report.disease_count,
+                'url': reverse('health_predictor:report_detail', kwargs={'pk': report.pk}),
+                'update_url': reverse('health_predictor:report_update', kwargs={'pk': report.pk}),
+                'share_url': reverse('health_predictor:report_share', kwargs={'pk': report.pk}),
+                'pdf_url': reverse('health_predictor:report_export', kwargs={'pk': report.pk, 'format': 'pdf'}),
+            } for report in page],
+            'next': page.next_cursor,
+        })